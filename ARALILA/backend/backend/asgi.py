@@ -9,6 +9,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django_asgi_app = get_asgi_application()
 from games import routing
+from backend import lifespan
 
 ALLOWED_WS_ORIGINS = [
     "http://localhost:3000",
@@ -20,6 +21,7 @@ ALLOWED_WS_ORIGINS = [
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
+    "lifespan": lifespan.app,
     "websocket": OriginValidator(
         AuthMiddlewareStack(
             URLRouter(
@@ -30,6 +32,9 @@ application = ProtocolTypeRouter({
     ),
 })
 
+# Daphne never sends the lifespan shutdown event
+lifespan.install_daphne_shutdown()
+
 # application = ProtocolTypeRouter({
 #     "http": django_asgi_app,
 #     "websocket": AuthMiddlewareStack(
@@ -38,7 +43,3 @@ application = ProtocolTypeRouter({
 #         )
 #     ),
 # })
-
-print("✅ ASGI application configured with WebSocket support")
-print(f"🌐 Allowed WebSocket origins: {ALLOWED_WS_ORIGINS}")
-print(f"📋 WebSocket routes: {routing.websocket_urlpatterns}")
\ No newline at end of file
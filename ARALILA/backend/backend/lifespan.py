@@ -0,0 +1,80 @@
+"""
+ASGI lifespan protocol handler.
+
+Modules register async startup/shutdown callbacks here; ``backend.asgi``
+routes the ``lifespan`` scope to ``app`` so servers that send lifespan
+events (uvicorn, hypercorn) run them. Daphne sends no lifespan events, so
+``backend.asgi`` also calls ``install_daphne_shutdown``: the shutdown
+callbacks then run when Daphne stops its Twisted reactor (SIGINT/SIGTERM),
+on the event loop that served the requests. Startup callbacks do not run
+under Daphne.
+"""
+import asyncio
+import sys
+
+from backend.log import get_logger
+
+log = get_logger(__name__)
+
+_startup = []
+_shutdown = []
+
+
+def on_startup(callback):
+    _startup.append(callback)
+    return callback
+
+
+def on_shutdown(callback):
+    _shutdown.append(callback)
+    return callback
+
+
+async def _run(callbacks):
+    for callback in callbacks:
+        await callback()
+
+
+async def _shutdown_on_reactor_stop():
+    try:
+        await _run(_shutdown)
+    except Exception:
+        log.exception("shutdown_failed")
+
+
+def on_reactor_shutdown(reactor):
+    """Run the shutdown callbacks before ``reactor`` stops; it waits for them."""
+    from twisted.internet import defer
+
+    def trigger():
+        return defer.Deferred.fromFuture(asyncio.ensure_future(_shutdown_on_reactor_stop()))
+
+    reactor.addSystemEventTrigger("before", "shutdown", trigger)
+
+
+def install_daphne_shutdown():
+    # daphne.server installs the asyncio reactor; importing the reactor any
+    # earlier would install Twisted's default one instead
+    if "daphne.server" in sys.modules:
+        from twisted.internet import reactor
+        on_reactor_shutdown(reactor)
+
+
+async def app(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await _run(_startup)
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            try:
+                await _run(_shutdown)
+            except Exception as e:
+                await send({"type": "lifespan.shutdown.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.shutdown.complete"})
+            return
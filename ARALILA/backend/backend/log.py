@@ -0,0 +1,116 @@
+"""
+Structured logging for the games, users and consumer code.
+
+    log = get_logger(__name__)
+    log.info("player_joined", room=room_name, player=player, players=len(players))
+
+Every call is an event name plus key/value fields. Nothing is formatted at
+the call site: a call returns straight away when its level is disabled, and
+events listed in ``LOG_SAMPLE_RATES`` are kept for only that fraction of
+calls (kept records carry ``sample_rate`` so counts can be scaled back up).
+``StructuredFormatter`` renders records as logfmt or JSON (``LOG_FORMAT``).
+
+With ``LOG_ASYNC`` the console handler is ``queue_handler()``: the caller,
+usually the event loop, only puts the record on a queue and a listener
+thread formats and writes it.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+
+def sample_rate(event):
+    return settings.LOG_SAMPLE_RATES.get(event, 1.0)
+
+
+class StructuredLogger:
+    """``logging.Logger`` wrapper taking an event name and fields."""
+
+    __slots__ = ('logger',)
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, event, fields, exc_info=False):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = sample_rate(event)
+        if rate < 1:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+        # stacklevel=3 attributes the record to the caller, not to this wrapper
+        self.logger.log(level, event, exc_info=exc_info, extra={'fields': fields}, stacklevel=3)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """Error with the current exception's traceback."""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+
+def _logfmt_value(value):
+    text = str(value)
+    if not text or any(c in text for c in ' ="\n'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: logfmt (``key=value``) or JSON. Works for plain stdlib records too."""
+
+    def __init__(self, format='logfmt'):
+        super().__init__(datefmt='%Y-%m-%dT%H:%M:%S%z')
+        self.json = format == 'json'
+
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+
+        if self.json:
+            return json.dumps(data, ensure_ascii=False, default=str)
+        return ' '.join(f"{key}={_logfmt_value(value)}" for key, value in data.items())
+
+
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The stdlib version formats the record here, on the caller's thread;
+        # the listener formats it instead
+        return record
+
+
+def queue_handler(format='logfmt'):
+    """Console handler that hands records to a background writer thread."""
+    target = logging.StreamHandler()
+    target.setFormatter(StructuredFormatter(format))
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, target)
+    listener.start()
+    atexit.register(listener.stop)
+    return _DeferredQueueHandler(records)
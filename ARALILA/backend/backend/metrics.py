@@ -0,0 +1,373 @@
+"""
+Per-request and per-message cost accounting.
+
+``request_metrics_middleware`` (``backend.middleware``) opens a
+``RequestMetrics`` for every request in a context variable. While it is
+open, an execute wrapper on every database connection adds each query and
+its duration, the shared Redis client counts round-trips (``redis_call``)
+and caches report lookups through ``cache_lookup``. Because it is a context
+variable, queries run from ``sync_to_async`` threads are counted against
+the request that started them.
+
+Finished requests are folded into per-endpoint aggregates, labelled by the
+resolved URL name. WebSocket consumers do the same per message with
+``message()``, labelled by socket kind and message type, and also report
+broadcasts, deliveries and open connections per room. Everything is served
+with the other component stats on ``GET /metrics/``.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'cache_hits', 'cache_misses', 'redis_calls')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.redis_calls = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def cache_lookup(hit):
+    """Count a cache lookup against the current request, if any."""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def redis_call():
+    """Count one Redis round-trip against the current request or message, if any."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.redis_calls += 1
+
+
+def _count_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+
+
+def install(connection):
+    """Attach the query counter to ``connection`` (once)."""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'errors', 'queries', 'max_queries', 'db_ms', 'wall_ms',
+                 'cache_hits', 'cache_misses', 'redis_calls', 'over_budget', 'recent')
+
+    def __init__(self, sample_size):
+        self.requests = 0
+        self.errors = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+        self.wall_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.redis_calls = 0
+        self.over_budget = 0
+        self.recent = deque(maxlen=sample_size)  # wall ms, for percentiles
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(pct):
+            return round(recent[min(len(recent) - 1, int(len(recent) * pct))], 2) if recent else 0.0
+
+        count = self.requests or 1
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'queries_avg': round(self.queries / count, 2),
+            'queries_max': self.max_queries,
+            'db_ms_avg': round(self.db_ms / count, 2),
+            'wall_ms_avg': round(self.wall_ms / count, 2),
+            'wall_ms_p50': percentile(0.5),
+            'wall_ms_p95': percentile(0.95),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'redis_calls_avg': round(self.redis_calls / count, 2),
+            'over_budget': self.over_budget,
+        }
+
+
+_endpoints = {}
+_lock = threading.Lock()
+
+
+def query_budget(label):
+    return settings.QUERY_BUDGETS.get(label, settings.QUERY_BUDGET_DEFAULT)
+
+
+def record(label, metrics, status_code, wall):
+    """Fold one finished request into its endpoint's aggregates. Returns True when over budget."""
+    budget = query_budget(label)
+    over_budget = budget is not None and metrics.queries > budget
+    with _lock:
+        stats = _endpoints.get(label)
+        if stats is None:
+            stats = _endpoints[label] = EndpointStats(settings.REQUEST_METRICS_SAMPLE_SIZE)
+        stats.requests += 1
+        stats.errors += status_code >= 500
+        stats.queries += metrics.queries
+        stats.max_queries = max(stats.max_queries, metrics.queries)
+        stats.db_ms += metrics.db_time * 1000
+        stats.wall_ms += wall * 1000
+        stats.cache_hits += metrics.cache_hits
+        stats.cache_misses += metrics.cache_misses
+        stats.redis_calls += metrics.redis_calls
+        stats.over_budget += over_budget
+        stats.recent.append(wall * 1000)
+    return over_budget
+
+
+def server_timing(metrics, wall):
+    return (
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+        f'cache;desc="{metrics.cache_hits} hits {metrics.cache_misses} misses", '
+        f'total;dur={wall * 1000:.1f}'
+    )
+
+
+def stats():
+    with _lock:
+        return {label: endpoint.summary() for label, endpoint in sorted(_endpoints.items())}
+
+
+# -------------------- WebSocket consumers --------------------
+# Consumers run on the event loop thread, so these counters are updated
+# without a lock; ``socket_stats`` only copies them.
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: O(log buckets) per observation, no samples kept."""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the ``pct`` quantile."""
+        target = pct * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 2) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 2),
+            'p95_ms': round(self.percentile(0.95), 2),
+            'p99_ms': round(self.percentile(0.99), 2),
+            'max_ms': round(self.max, 2),
+        }
+
+
+class RateCounter:
+    """Events per second over the last ``window`` seconds, one slot per second."""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [0] * window
+
+    def add(self, now):
+        second = int(now)
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += 1
+
+    def rate(self, now):
+        oldest = int(now) - self.window
+        return sum(count for count, second in zip(self.counts, self.seconds) if second > oldest) / self.window
+
+
+class MessageStats:
+    __slots__ = ('latency', 'redis_calls', 'errors')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.redis_calls = 0
+        self.errors = 0
+
+
+_messages = defaultdict(MessageStats)       # (kind, msg_type)
+_message_rate = RateCounter()
+_broadcasts = defaultdict(lambda: [0, 0])  # (kind, event type) -> [sends, payload bytes]
+_deliveries = defaultdict(int)              # kind -> messages delivered to sockets
+_rooms = defaultdict(dict)                  # kind -> {room: open connections}
+_timings = defaultdict(Histogram)           # e.g. 'ai_evaluation'
+
+
+class message:
+    """
+    ``with message(kind, msg_type):`` times one inbound WebSocket message and
+    counts the Redis round-trips it makes. A plain class rather than a
+    generator context manager, since it runs for every message.
+    """
+
+    __slots__ = ('key', 'metrics', 'token')
+
+    def __init__(self, kind, msg_type):
+        self.key = (kind, msg_type)
+
+    def __enter__(self):
+        self.metrics = RequestMetrics()
+        self.token = _current.set(self.metrics)
+        return self.metrics
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        stats = _messages[self.key]
+        stats.latency.observe(self.metrics.elapsed() * 1000)
+        stats.redis_calls += self.metrics.redis_calls
+        stats.errors += exc_type is not None
+        _message_rate.add(time.time())
+
+
+def broadcast(kind, event_type, size=0):
+    counts = _broadcasts[(kind, event_type)]
+    counts[0] += 1
+    counts[1] += size
+
+
+def delivered(kind):
+    _deliveries[kind] += 1
+
+
+def connected(kind, room):
+    rooms = _rooms[kind]
+    rooms[room] = rooms.get(room, 0) + 1
+
+
+def disconnected(kind, room):
+    rooms = _rooms[kind]
+    remaining = rooms.get(room, 0) - 1
+    if remaining > 0:
+        rooms[room] = remaining
+    else:
+        rooms.pop(room, None)
+
+
+@contextmanager
+def timed(name):
+    """Record how long the block takes under ``name`` (e.g. an LLM call)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[name].observe((time.perf_counter() - start) * 1000)
+
+
+def socket_stats():
+    """
+    Per-process WebSocket counters. ``fanout_avg`` is deliveries per
+    broadcast, which is only exact when summed over every worker.
+    """
+    messages = {}
+    for (kind, msg_type), stats in sorted(list(_messages.items())):
+        count = stats.latency.count or 1
+        messages[f"{kind}:{msg_type}"] = {
+            **stats.latency.summary(),
+            'redis_calls_avg': round(stats.redis_calls / count, 2),
+            'errors': stats.errors,
+        }
+
+    sends = {}
+    for kind in set(kind for kind, _ in list(_broadcasts)) | set(_deliveries):
+        kind_broadcasts = [(event, counts) for (k, event), counts in list(_broadcasts.items()) if k == kind]
+        total = sum(counts[0] for _, counts in kind_broadcasts)
+        sends[kind] = {
+            'broadcasts': {
+                # Size is only known for pre-encoded payloads
+                event: {'count': c[0], 'bytes_avg': round(c[1] / c[0], 1) if c[1] else None}
+                for event, c in kind_broadcasts
+            },
+            'deliveries': _deliveries[kind],
+            'fanout_avg': round(_deliveries[kind] / total, 2) if total else 0.0,
+        }
+
+    return {
+        'messages_per_second': round(_message_rate.rate(time.time()), 2),
+        'messages': messages,
+        'broadcasts': sends,
+        'rooms': {
+            kind: {'rooms': len(rooms), 'connections': sum(list(rooms.values()))}
+            for kind, rooms in list(_rooms.items())
+        },
+        'timings': {name: histogram.summary() for name, histogram in list(_timings.items())},
+    }
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+    for counters in (_messages, _broadcasts, _deliveries, _rooms, _timings):
+        counters.clear()
+    _message_rate.__init__()
@@ -0,0 +1,66 @@
+"""
+Request instrumentation (see ``backend.metrics``).
+
+Supports both sync and async stacks. Every entry in MIDDLEWARE has to, or
+Django runs the whole chain, async views included, through
+``sync_to_async`` (see ``backend.static``).
+
+With ``SERVER_TIMING_HEADER`` (defaults to DEBUG) the request's query
+count and DB time are also sent to the client in ``Server-Timing``.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+from backend import metrics
+from backend.log import get_logger
+
+log = get_logger(__name__)
+
+
+def _label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route
+
+
+def _finish(request, response, request_metrics):
+    wall = request_metrics.elapsed()
+    label = _label(request)
+    if metrics.record(label, request_metrics, response.status_code, wall):
+        log.warning(
+            "query_budget_exceeded",
+            endpoint=label,
+            queries=request_metrics.queries,
+            budget=metrics.query_budget(label),
+            db_ms=round(request_metrics.db_time * 1000, 1),
+        )
+    if settings.SERVER_TIMING_HEADER:
+        response['Server-Timing'] = metrics.server_timing(request_metrics, wall)
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request_metrics, token = metrics.start_request()
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.end_request(token)
+            return _finish(request, response, request_metrics)
+    else:
+        def middleware(request):
+            # Connections opened before the counter was registered miss connection_created
+            metrics.install(connection)
+            request_metrics, token = metrics.start_request()
+            try:
+                response = get_response(request)
+            finally:
+                metrics.end_request(token)
+            return _finish(request, response, request_metrics)
+
+    return middleware
@@ -12,25 +12,18 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import os
 import dj_database_url  # ADD THIS IMPORT
 
-load_dotenv(encoding='utf-8')  # Load environment variables from .env file
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# ✅ DEBUG: Print which env file is being used
-env_file = BASE_DIR / '.env.local'
-print(f"🔍 Looking for env file at: {env_file}")
-print(f"🔍 Env file exists: {env_file.exists()}")
-
-load_dotenv(env_file)
-
-# ✅ DEBUG: Print the Redis URL being used
-REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-print(f"🔍 REDIS_URL: {REDIS_URL}")
+# Environment variables from .env, then .env.local (already-set variables win)
+for env_file in (BASE_DIR / '.env', BASE_DIR / '.env.local'):
+    if env_file.exists():
+        load_dotenv(env_file, encoding='utf-8')
 
 
 # Quick-start development settings - unsuitable for production
@@ -47,6 +40,10 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
 
+# Verified-token cache used by users.supabase_auth (users are read per request)
+SUPABASE_AUTH_CACHE_SIZE = int(os.getenv('SUPABASE_AUTH_CACHE_SIZE', '1024'))
+SUPABASE_AUTH_CACHE_ALIAS = os.getenv('SUPABASE_AUTH_CACHE_ALIAS') or None  # e.g. 'redis'
+
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
 ALLOWED_HOSTS = [
@@ -99,8 +96,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.request_metrics_middleware',  # first, so it times everything below
     'corsheaders.middleware.CorsMiddleware',  # MOVED: Should be first after security
-    'whitenoise.middleware.WhiteNoiseMiddleware', 
+    'backend.static.AsyncWhiteNoiseMiddleware',  # WhiteNoise's own middleware is sync-only
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -133,18 +131,63 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 ASGI_APPLICATION = "backend.asgi.application"
 
-# CHANGED: Use Redis URL from environment variable
+# Nothing connects at import time; GET /ready checks Redis and the database
 REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
+READINESS_TIMEOUT = float(os.getenv('READINESS_TIMEOUT', '2'))  # seconds per dependency check
+
+# Shared async Redis pool used by the WebSocket consumers (games.redis_pool)
+REDIS_POOL_MAX_CONNECTIONS = int(os.getenv('REDIS_POOL_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))  # seconds to wait for a free connection
 
-print(f"🔧 Redis URL: {REDIS_URL}")
+# Cache configuration ('redis' is only connected to when something uses it)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    },
+}
 
-try:
-    import redis
-    r = redis.from_url(REDIS_URL)
-    r.ping()
-    print("✅ Redis connected successfully")
-except Exception as e:
-    print(f"❌ Redis connection failed: {e}")
+# Serialized question sets (games.question_cache); point at 'redis' to share
+# invalidation across workers
+QUESTION_CACHE_ALIAS = os.getenv('QUESTION_CACHE_ALIAS', 'default')
+QUESTION_CACHE_TTL = int(os.getenv('QUESTION_CACHE_TTL', '300'))  # seconds
+
+# LLM evaluation; the client is built on first use (games.openai_client)
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+# Emoji sentence evaluation (games.emoji_evaluation)
+EMOJI_EVAL_MAX_CONCURRENCY = int(os.getenv('EMOJI_EVAL_MAX_CONCURRENCY', '16'))  # OpenAI calls per worker
+EMOJI_EVAL_TIMEOUT = float(os.getenv('EMOJI_EVAL_TIMEOUT', '20'))  # seconds, queueing included
+
+# Story-chain round evaluation (games.consumers.evaluation_pool)
+STORY_EVAL_WORKERS = int(os.getenv('STORY_EVAL_WORKERS', '8'))  # concurrent evaluations per worker
+STORY_EVAL_QUEUE_SIZE = int(os.getenv('STORY_EVAL_QUEUE_SIZE', '200'))  # beyond this, rounds get the fallback score
+STORY_EVAL_TIMEOUT = float(os.getenv('STORY_EVAL_TIMEOUT', '20'))  # seconds per evaluation
+# seconds after which a round whose evaluation job was lost (worker died) gets the fallback score
+STORY_EVAL_RECOVERY_AFTER = float(os.getenv('STORY_EVAL_RECOVERY_AFTER', '120'))
+# 'per_round': one LLM call per round; 'end_of_game': heuristic per round, one LLM call per game
+STORY_EVAL_MODE = os.getenv('STORY_EVAL_MODE', 'per_round')
+STORY_BATCH_EVALUATOR = os.getenv('STORY_BATCH_EVALUATOR', 'games.consumers.story_scoring.llm_batch_evaluator')
+STORY_BATCH_EVAL_TIMEOUT = float(os.getenv('STORY_BATCH_EVAL_TIMEOUT', '60'))  # seconds
+
+# Story-chain history stream, drained by `manage.py persist_story_events` (games.story_persistence)
+STORY_EVENTS_STREAM_MAXLEN = int(os.getenv('STORY_EVENTS_STREAM_MAXLEN', '100000'))
+
+# Encoding of story-chain broadcasts to clients (games.codec): 'json' text frames or 'msgpack' binary frames
+STORY_WIRE_CODEC = os.getenv('STORY_WIRE_CODEC', 'json')
+
+# Lobby/story presence (games.consumers.presence): stale players are evicted once their heartbeat expires
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', '30'))  # seconds without a heartbeat before a player is stale
+PRESENCE_HEARTBEAT_INTERVAL = float(os.getenv('PRESENCE_HEARTBEAT_INTERVAL', '10'))
+PRESENCE_SWEEP_INTERVAL = float(os.getenv('PRESENCE_SWEEP_INTERVAL', '10'))
+
+# Shared LLM evaluation results (games.evaluation_cache)
+EVALUATION_CACHE_TTL = int(os.getenv('EVALUATION_CACHE_TTL', str(7 * 24 * 3600)))  # seconds
+EVALUATION_CACHE_MAX_ENTRIES = int(os.getenv('EVALUATION_CACHE_MAX_ENTRIES', '20000'))  # per namespace
+EVALUATION_CACHE_TIMEOUT = float(os.getenv('EVALUATION_CACHE_TIMEOUT', '0.25'))  # seconds per read/write
 
 # WebSocket Configuration
 WEBSOCKET_ALLOWED_ORIGINS = [
@@ -212,9 +255,40 @@ DATABASES = {
             'connect_timeout': 10,
         },
         'CONN_MAX_AGE': 0,
+        # The Supabase pooler on 6543 is pgbouncer in transaction mode: consecutive
+        # transactions may land on different server connections, so no cursor may
+        # outlive one. (With psycopg 3 Django also leaves prepared statements off.)
+        'DISABLE_SERVER_SIDE_CURSORS': True,
     }
 }
 
+# Database connection reuse. 'per_request' is the default; switch only after
+# `manage.py bench_db_latency` against the real database shows a gain
+#   'per_request': a new connection, TLS handshake and auth for every request
+#   'persistent':  each thread keeps its connection for DB_CONN_MAX_AGE seconds,
+#                  checked before reuse. For WSGI and management commands: under
+#                  ASGI every request runs in its own thread, so use 'pool'
+#   'pool':        psycopg 3 pool shared by the process (install psycopg[binary,pool])
+DB_CONN_MODE = os.getenv('DB_CONN_MODE', 'per_request')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))  # seconds, 'persistent' mode
+DB_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),  # keep under the pooler's client limit per worker
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),  # seconds before an idle connection is closed
+}
+
+if DB_CONN_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONN_MODE == 'pool':
+    # Connections go back to the pool at the end of each request (CONN_MAX_AGE
+    # must stay 0); health checks make the pool test them before handing out
+    DATABASES['default']['OPTIONS']['pool'] = DB_POOL_OPTIONS
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONN_MODE != 'per_request':
+    raise ImproperlyConfigured(f"DB_CONN_MODE must be 'per_request', 'persistent' or 'pool', not {DB_CONN_MODE!r}")
+
 
 # my database
 # DATABASES = {
@@ -330,25 +404,53 @@ if not DEBUG:
     # Trust Render's proxy headers
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
-# ADD: Logging configuration for production debugging
+# Per-request query/latency accounting (backend.metrics), served on GET /metrics/
+REQUEST_METRICS_SAMPLE_SIZE = int(os.getenv('REQUEST_METRICS_SAMPLE_SIZE', '512'))  # recent requests kept per endpoint
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # bearer token for /metrics/; without one it is only served with DEBUG
+# Per-response query count and DB time in a Server-Timing header, visible to any client
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', str(DEBUG)) == 'True'
+# Queries per request above which a warning is logged, by URL name; None disables the check
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '20'))
+QUERY_BUDGETS = {
+    'unlocked_areas': 6,
+    'area_detail': 6,
+    'area_by_order': 6,
+    'get_game_questions_by_difficulty': 8,
+    'submit_game_score': 12,
+}
+
+# Logging (backend.log): structured lines, sampled per event, written off the event loop
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'logfmt')  # or 'json'
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'True') == 'True'  # write from a background thread
+# Fraction of occurrences kept for high-volume events; unlisted events are always kept
+LOG_SAMPLE_RATES = {
+    'ws_message_received': float(os.getenv('LOG_SAMPLE_WS_MESSAGE', '0.01')),
+    'lobby_player_list_sent': float(os.getenv('LOG_SAMPLE_WS_MESSAGE', '0.01')),
+    'questions_served': float(os.getenv('LOG_SAMPLE_QUESTIONS_SERVED', '0.1')),
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
+        'structured': {
+            '()': 'backend.log.StructuredFormatter',
+            'format': LOG_FORMAT,
         },
     },
     'handlers': {
         'console': {
+            '()': 'backend.log.queue_handler',
+            'format': LOG_FORMAT,
+        } if LOG_ASYNC else {
             'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            'formatter': 'structured',
         },
     },
     'root': {
         'handlers': ['console'],
-        'level': 'INFO' if not DEBUG else 'DEBUG',
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
@@ -362,4 +464,4 @@ LOGGING = {
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
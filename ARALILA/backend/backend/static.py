@@ -0,0 +1,37 @@
+"""
+Static files for the ASGI stack.
+
+``WhiteNoiseMiddleware`` is sync-only, and a single sync-only middleware
+makes Django run the whole chain, async views included, through
+``sync_to_async``: every request then holds a worker thread even while it
+only awaits (e.g. an LLM call). ``AsyncWhiteNoiseMiddleware`` serves the
+same files with the same settings but supports both modes.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Scans the disk (DEBUG only), so not on the event loop
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -4,9 +4,15 @@ from django.conf.urls.static import static
 from django.urls import path, include
 # from users.views import CreateUserView 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView 
+from django.db import connection
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from backend import metrics
+from backend.log import get_logger
+
+log = get_logger(__name__)
+
 @csrf_exempt
 def health_check(request):
     """Health check endpoint"""
@@ -17,7 +23,82 @@ def health_check(request):
     })
 
 
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def check_redis():
+    import redis
+    client = redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.READINESS_TIMEOUT,
+        socket_timeout=settings.READINESS_TIMEOUT,
+    )
+    try:
+        client.ping()
+    finally:
+        client.close()
+
+
+def component_stats():
+    from games import evaluation_cache, prescorer, redis_pool
+    from games.consumers import evaluation_pool
+    from users import auth_cache
+    return {
+        'auth_cache': auth_cache.stats(),
+        'evaluation_cache': evaluation_cache.stats(),
+        'prescorer': prescorer.stats(),
+        'redis_pool': redis_pool.stats(),
+        'evaluation_pool': evaluation_pool.stats(),
+    }
+
+
+@csrf_exempt
+def metrics_view(request):
+    """Per-endpoint request aggregates and cache/pool stats for this process"""
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return JsonResponse({'error': 'Forbidden'}, status=403)
+    elif not settings.DEBUG:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse({
+        'endpoints': metrics.stats(),
+        'websocket': metrics.socket_stats(),
+        'components': component_stats(),
+    })
+
+
+READINESS_CHECKS = {
+    'database': check_database,
+    'redis': check_redis,
+}
+
+
+@csrf_exempt
+def readiness_check(request):
+    """Readiness probe: 200 once every dependency answers, 503 otherwise.
+    Failures are logged; the unauthenticated response only says which check failed."""
+    checks = {}
+    for name, check in READINESS_CHECKS.items():
+        try:
+            check()
+            checks[name] = 'ok'
+        except Exception:
+            log.exception("readiness_check_failed", check=name)
+            checks[name] = 'fail'
+    ready = all(result == 'ok' for result in checks.values())
+    return JsonResponse(
+        {'status': 'ready' if ready else 'unavailable', 'checks': checks},
+        status=200 if ready else 503,
+    )
+
+
 urlpatterns = [
+    path('health/', health_check, name='health_check'),
+    path('ready/', readiness_check, name='readiness_check'),
+    path('metrics/', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     # path('api/users/register/', CreateUserView.as_view(), name='user-register'),
     path('api/users/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
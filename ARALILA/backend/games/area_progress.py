@@ -0,0 +1,169 @@
+from collections import defaultdict
+
+from django.db.models import Count, Max
+
+from .models import Area, Game
+from progress.models import GameProgress
+
+MINIMUM_SCORE_THRESHOLD = 70  # 70% average required
+DEFAULT_GAMES_PER_AREA = 6  # Expected games per area when an area has no items yet
+
+
+def build_area_map(user):
+    """
+    Build the lock/unlock map for every active area in two queries.
+
+    One query loads the areas with their item counts, a second one loads the
+    user's best score per (area, game). The lock chain is then resolved in a
+    single in-memory pass over the ordered areas.
+    """
+    areas = list(
+        Area.objects.filter(is_active=True)
+        .order_by('order_index')
+        .annotate(item_count=Count('items'))
+    )
+
+    best_scores_by_area = defaultdict(list)
+    progress_rows = GameProgress.objects.filter(
+        user=user,
+        area__in=[area.id for area in areas],
+        completed=True,
+    ).values('area_id', 'game_id').annotate(
+        best_score=Max('score')
+    ).order_by()
+
+    for row in progress_rows:
+        best_scores_by_area[row['area_id']].append(row['best_score'])
+
+    areas_data = []
+    previous = None
+
+    for area in areas:
+        total_games = area.item_count or DEFAULT_GAMES_PER_AREA
+        best_scores = best_scores_by_area.get(area.id, [])
+        completed_games = len(best_scores)
+        average_score = sum(best_scores) / len(best_scores) if best_scores else 0
+
+        if previous is None:
+            is_locked = False
+            message = "Start your journey here!"
+        elif previous['completed_games'] < previous['total_games']:
+            is_locked = True
+            message = f"Complete all games in {previous['name']} to unlock"
+        elif previous['average_score'] < MINIMUM_SCORE_THRESHOLD:
+            is_locked = True
+            message = f"Achieve 70% average in {previous['name']} (current: {previous['average_score']:.0f}%)"
+        else:
+            is_locked = False
+            message = "Unlocked!"
+
+        areas_data.append({
+            'id': area.id,  # Database ID (for reference)
+            'order_index': area.order_index,
+            'name': area.name,
+            'description': area.description,
+            'is_locked': is_locked,
+            'completed_games': completed_games,
+            'total_games': total_games,
+            'average_score': round(average_score, 1),
+            'message': message,
+            'theme_color': area.theme_color,
+        })
+
+        previous = {
+            'name': area.name,
+            'completed_games': completed_games,
+            'total_games': total_games,
+            'average_score': average_score,
+        }
+
+    return areas_data
+
+
+def next_difficulty_for(progress):
+    """First incomplete difficulty, cycling back to Easy once mastered."""
+    if not progress.difficulty_1_completed:
+        return 1
+    if not progress.difficulty_2_completed:
+        return 2
+    if not progress.difficulty_3_completed:
+        return 3
+    return 1
+
+
+def build_area_detail(user, area):
+    """
+    Build the area card and per-game star progress for one area.
+
+    Loads the area's games and all of the user's GameProgress rows for the
+    area in one query each, then keys progress by game_id in memory.
+    """
+    games_in_area = Game.objects.filter(items__area=area).distinct().order_by('order_index')
+    progress_by_game = {
+        progress.game_id: progress
+        for progress in GameProgress.objects.filter(user=user, area=area)
+    }
+
+    games_data = []
+    for game in games_in_area:
+        progress = progress_by_game.get(game.id)
+        game_type = game.game_type if game.game_type else 'unknown'
+
+        if progress:
+            games_data.append({
+                'id': game.id,
+                'name': game.name,
+                'description': game.description,
+                'game_type': game_type,
+                'stars_earned': progress.stars_earned,
+                'next_difficulty': next_difficulty_for(progress),
+                'difficulty_scores': {
+                    1: progress.difficulty_1_score,
+                    2: progress.difficulty_2_score,
+                    3: progress.difficulty_3_score,
+                },
+                'difficulty_unlocked': {
+                    1: True,
+                    2: progress.difficulty_1_completed,
+                    3: progress.difficulty_2_completed,
+                },
+                'best_score': progress.score,
+                'completed': progress.completed,
+                'attempts': 1,  # unique per (user, area, game)
+                'replay_mode': progress.stars_earned == 3,
+            })
+        else:
+            games_data.append({
+                'id': game.id,
+                'name': game.name,
+                'description': game.description,
+                'game_type': game_type,
+                'stars_earned': 0,
+                'next_difficulty': 1,
+                'difficulty_scores': {1: 0, 2: 0, 3: 0},
+                'difficulty_unlocked': {1: True, 2: False, 3: False},
+                'best_score': 0,
+                'completed': False,
+                'attempts': 0,
+                'replay_mode': False,
+            })
+
+    completed_count = sum(1 for g in games_data if g['completed'])
+    total_games = len(games_data) or DEFAULT_GAMES_PER_AREA
+
+    scores = [g['best_score'] for g in games_data if g['best_score'] > 0]
+    avg_score = sum(scores) / len(scores) if scores else 0
+
+    return {
+        'area': {
+            'id': area.id,
+            'order_index': area.order_index,
+            'name': area.name,
+            'description': area.description,
+            'completed_games': completed_count,
+            'total_games': total_games,
+            'average_score': round(avg_score, 1),
+            'theme_color': area.theme_color,
+        },
+        'games': games_data
+    }
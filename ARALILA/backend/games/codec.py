@@ -0,0 +1,42 @@
+"""
+Codecs for messages sent to WebSocket clients.
+
+A room broadcast is encoded once by the sender and the encoded payload is
+what travels through the channel layer. Each consumer just forwards it, so
+no recipient encodes it again. ``json`` (text frames) is what the frontend
+reads. ``msgpack`` (binary frames) is smaller and faster to encode, for
+clients that can decode it. Select one with ``STORY_WIRE_CODEC``.
+"""
+import json
+
+import msgpack
+from django.conf import settings
+
+
+class JSONCodec:
+    name = "json"
+    binary = False
+
+    def encode(self, message):
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {codec.name: codec for codec in (JSONCodec(), MsgpackCodec())}
+
+
+def get_codec(name=None):
+    return CODECS[name or settings.STORY_WIRE_CODEC]
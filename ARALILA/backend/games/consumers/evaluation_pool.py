@@ -0,0 +1,86 @@
+"""
+Bounded background pool for story-round evaluations.
+
+Jobs are queued and run by ``STORY_EVAL_WORKERS`` worker tasks, so the
+socket that finished a round never waits for the LLM. The queue holds at
+most ``STORY_EVAL_QUEUE_SIZE`` jobs; ``submit`` returns False when it is
+full and the caller scores the round without the LLM. There is one pool per
+event loop (in practice one per worker process), stopped on server
+shutdown (``backend.lifespan``). Queued jobs die with the process;
+story_game arms an evaluation deadline for each round so those rounds are
+still awarded.
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+
+from backend import lifespan
+from backend.log import get_logger
+
+log = get_logger(__name__)
+
+_pools = weakref.WeakKeyDictionary()
+
+
+class EvaluationPool:
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self._stats = {'submitted': 0, 'rejected': 0, 'failed': 0}
+
+    def submit(self, job, *args):
+        """Queue ``await job(*args)``. Returns False if the queue is full."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        try:
+            self.queue.put_nowait((job, args))
+        except asyncio.QueueFull:
+            self._stats['rejected'] += 1
+            return False
+        self._stats['submitted'] += 1
+        return True
+
+    async def _work(self):
+        while True:
+            job, args = await self.queue.get()
+            try:
+                await job(*args)
+            except Exception:
+                self._stats['failed'] += 1
+                log.exception("background_evaluation_failed", job=getattr(job, "__qualname__", repr(job)))
+            finally:
+                self.queue.task_done()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {**self._stats, 'queued': self.queue.qsize(), 'workers': len(self._tasks)}
+
+
+def get_evaluation_pool():
+    """Evaluation pool for the running event loop."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = EvaluationPool(settings.STORY_EVAL_WORKERS, settings.STORY_EVAL_QUEUE_SIZE)
+        _pools[loop] = pool
+    return pool
+
+
+async def close():
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.stop()
+
+
+def stats():
+    return {'pools': [pool.stats() for pool in list(_pools.values())]}
+
+
+lifespan.on_shutdown(close)
@@ -1,39 +1,64 @@
 import json
+import random
 from channels.generic.websocket import AsyncWebsocketConsumer
-from redis import asyncio as aioredis
-from django.conf import settings
+from channels.layers import get_channel_layer
+from backend import metrics
+from backend.log import get_logger
+from games.redis_pool import get_redis
+from . import presence
+from .lobby_state import Lobby
+
+log = get_logger(__name__)
+
+
+async def send_to_lobby(channel_layer, room_code, event):
+    metrics.broadcast("lobby", event["type"])
+    await channel_layer.group_send(f"lobby_{room_code}", event)
+
+
+async def list_players(redis, room_code):
+    return await Lobby(redis, room_code).players()
+
+
+async def evict_player(room_code, player):
+    """Presence callback: a lobby member whose connection is gone."""
+    removed, players = await Lobby(await get_redis(), room_code).leave(player)
+    if removed:
+        await send_to_lobby(
+            get_channel_layer(), room_code,
+            {"type": "player_left", "player": player, "players": players},
+        )
+
+
+presence.register("lobby", list_players, evict_player)
 
-async def get_redis():
-    """Singleton Redis connection."""
-    return aioredis.from_url(settings.REDIS_URL, decode_responses=True)
 
 class LobbyConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        # disconnect() also runs after a connect that failed part-way
+        self.lobby = None
+        self.presence = None
+        with metrics.message("lobby", "connect"):
+            await self.join_lobby()
+
+    async def join_lobby(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code']
         self.room_group_name = f"lobby_{self.room_code}"
         self.player_name = self.scope["query_string"].decode().split("=")[-1]
-        
-        print(f"🔌 Player '{self.player_name}' connecting to room '{self.room_code}'")
-        
+
         # Use Redis
         self.redis = await get_redis()
-        await self.redis.ping()
-        
-        # Get existing players from Redis
-        players_json = await self.redis.get(f"room:{self.room_code}:players")
-        players = json.loads(players_json) if players_json else []
-
-        # NEW: Check if player already exists (prevent duplicates)
-        if self.player_name in players:
-            print(f"⚠️ Player '{self.player_name}' already in room, not adding again")
-        else:
-            players.append(self.player_name)
-            await self.redis.set(
-                f"room:{self.room_code}:players", 
-                json.dumps(players),
-                ex=3600  # Expire in 1 hour
-            )
-            print(f"✅ Player '{self.player_name}' added. Total: {len(players)}")
+        self.lobby = Lobby(self.redis, self.room_code)
+        metrics.connected("lobby", self.room_code)
+
+        # Atomic add (no-op if the player is already in) and start check
+        added, start_game, players = await self.lobby.join(self.player_name)
+
+        log.info("lobby_joined", room=self.room_code, player=self.player_name, added=added, players=len(players))
+
+        self.presence = presence.Presence(self.redis, "lobby", self.room_code, self.player_name)
+        await self.presence.start()
+        await presence.start_sweeper()
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
@@ -44,61 +69,46 @@ class LobbyConsumer(AsyncWebsocketConsumer):
             "type": "player_list",
             "players": players,
         }))
-        print(f"📤 Sent player_list to '{self.player_name}': {players}")
+        log.debug("lobby_player_list_sent", room=self.room_code, player=self.player_name, players=len(players))
 
         # Notify everyone (including this player) that someone joined
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "player_joined",
-                "player": self.player_name,
-                "players": players,
-            }
-        )
+        await send_to_lobby(self.channel_layer, self.room_code, {
+            "type": "player_joined",
+            "player": self.player_name,
+            "players": players,
+        })
 
-        # Auto-start game if 3 players
-        if len(players) == 3:
-            import random
+        # Auto-start game once 3 players are in; only the join that filled the lobby does it
+        if start_game:
             turn_order = players.copy()
             random.shuffle(turn_order)
-            
-            print(f"🚀 Auto-starting game with turn order: {turn_order}")
-            
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "game_start",
-                    "turn_order": turn_order,
-                }
-            )
+            log.info("lobby_game_started", room=self.room_code, turn_order=",".join(turn_order))
+
+            await send_to_lobby(self.channel_layer, self.room_code, {
+                "type": "game_start",
+                "turn_order": turn_order,
+            })
 
     async def disconnect(self, close_code):
-        print(f"🔌 Player '{self.player_name}' disconnecting from room '{self.room_code}'")
-        
-        # Get current players from Redis
-        players_json = await self.redis.get(f"room:{self.room_code}:players")
-        players = json.loads(players_json) if players_json else []
-        
-        if self.player_name in players:
-            players.remove(self.player_name)
-            await self.redis.set(
-                f"room:{self.room_code}:players", 
-                json.dumps(players),
-                ex=3600
-            )
-            print(f"✅ Player '{self.player_name}' removed. Remaining: {len(players)}")
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
+        if self.lobby is None:
+            return
+        metrics.disconnected("lobby", self.room_code)
+        with metrics.message("lobby", "disconnect"):
+            if self.presence is not None:
+                self.presence.stop()
+
+            removed, players = await self.lobby.leave(self.player_name)
+            log.info("lobby_left", room=self.room_code, player=self.player_name, removed=removed, players=len(players))
+
+            await send_to_lobby(self.channel_layer, self.room_code, {
                 "type": "player_left",
                 "player": self.player_name,
                 "players": players,
-            }
-        )
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            })
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     async def player_joined(self, event):
+        metrics.delivered("lobby")
         await self.send(text_data=json.dumps({
             "type": "player_joined",
             "player": event["player"],
@@ -106,6 +116,7 @@ class LobbyConsumer(AsyncWebsocketConsumer):
         }))
 
     async def player_left(self, event):
+        metrics.delivered("lobby")
         await self.send(text_data=json.dumps({
             "type": "player_left",
             "player": event["player"],
@@ -113,11 +124,17 @@ class LobbyConsumer(AsyncWebsocketConsumer):
         }))
 
     async def game_start(self, event):
+        metrics.delivered("lobby")
         await self.send(text_data=json.dumps({
             "type": "game_start",
             "turn_order": event["turn_order"],
         }))
 
     async def receive(self, text_data):
-        # No-op for now
-        pass
\ No newline at end of file
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            return
+        if data.get("type") == "heartbeat":
+            with metrics.message("lobby", "heartbeat"):
+                await self.presence.touch()
\ No newline at end of file
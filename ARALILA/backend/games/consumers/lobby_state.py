@@ -0,0 +1,67 @@
+"""
+Redis-backed lobby membership.
+
+    room:{code}:members  ZSET  player -> join time (ms), so ZRANGE is join order
+    room:{code}:started  STRING set once when the game is started
+
+Joining and leaving are single Lua scripts: the membership change, the
+resulting player list and the start check happen atomically, so
+simultaneous joins on any number of workers cannot overwrite each other and
+exactly one join sees ``started`` for a room.
+"""
+import time
+
+ROOM_TTL = 3600  # seconds
+PLAYERS_TO_START = 3
+
+# ARGV: player, join time, players needed to start, ttl
+JOIN = """
+local added = redis.call('ZADD', KEYS[1], 'NX', ARGV[2], ARGV[1])
+local started = 0
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    if redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[4]) then started = 1 end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {added, started, unpack(redis.call('ZRANGE', KEYS[1], 0, -1))}
+"""
+
+# ARGV: player
+LEAVE = """
+local removed = redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return {removed}
+end
+return {removed, unpack(redis.call('ZRANGE', KEYS[1], 0, -1))}
+"""
+
+
+class Lobby:
+    """Atomic membership operations on one lobby."""
+
+    def __init__(self, redis, room_code, ttl=ROOM_TTL, players_to_start=PLAYERS_TO_START):
+        self.redis = redis
+        self.ttl = ttl
+        self.players_to_start = players_to_start
+        self.keys = [f"room:{room_code}:members", f"room:{room_code}:started"]
+        self._join = redis.register_script(JOIN)
+        self._leave = redis.register_script(LEAVE)
+
+    async def join(self, player):
+        """
+        Add ``player``. Returns (added, start, players); ``start`` is true for
+        exactly one join per lobby, the one that filled it.
+        """
+        added, started, *players = await self._join(
+            keys=self.keys,
+            args=[player, int(time.time() * 1000), self.players_to_start, self.ttl],
+        )
+        return bool(added), bool(started), players
+
+    async def leave(self, player):
+        """Remove ``player``. Returns (removed, remaining players)."""
+        removed, *players = await self._leave(keys=self.keys, args=[player])
+        return bool(removed), players
+
+    async def players(self):
+        return await self.redis.zrange(self.keys[0], 0, -1)
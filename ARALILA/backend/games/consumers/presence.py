@@ -0,0 +1,158 @@
+"""
+Presence tracking and stale-player eviction for lobby and story rooms.
+
+Every connection that has joined a room runs a heartbeat loop that refreshes
+``presence:{kind}:{room}:{player}`` (expires after ``PRESENCE_TTL``) and
+marks the room in the ``presence:rooms`` index. Clients may also send
+``{"type": "heartbeat"}``. When a worker dies, or a socket is gone without a
+clean close, its keys simply expire.
+
+One sweeper per worker wakes every ``PRESENCE_SWEEP_INTERVAL``; whichever
+worker takes the ``presence:sweep`` lock for that interval checks every
+indexed room and calls the kind's ``evict(room, player)`` for players whose
+presence key is gone. Kinds register how to list and evict their players
+with ``register``. Rooms with no players left drop out of the index.
+"""
+import asyncio
+import time
+import weakref
+
+from django.conf import settings
+
+from backend import lifespan
+from backend.log import get_logger
+from games.redis_pool import get_redis
+
+log = get_logger(__name__)
+
+ROOMS_KEY = "presence:rooms"
+SWEEP_LOCK_KEY = "presence:sweep"
+ROOM_IDLE_SECONDS = 3600  # rooms without any heartbeat for this long leave the index
+
+# kind -> (async list_players(redis, room), async evict(room, player))
+_kinds = {}
+_sweepers = weakref.WeakKeyDictionary()
+
+
+def register(kind, list_players, evict):
+    _kinds[kind] = (list_players, evict)
+
+
+def presence_key(kind, room, player):
+    return f"presence:{kind}:{room}:{player}"
+
+
+class Presence:
+    """Heartbeat for one player's connection to one room."""
+
+    def __init__(self, redis, kind, room, player):
+        self.redis = redis
+        self.kind = kind
+        self.room = room
+        self.player = player
+        self._task = None
+
+    async def touch(self):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(presence_key(self.kind, self.room, self.player), 1, ex=settings.PRESENCE_TTL)
+            pipe.zadd(ROOMS_KEY, {f"{self.kind}:{self.room}": time.time()})
+            await pipe.execute()
+
+    async def start(self):
+        await self.touch()
+        if self._task is None:
+            self._task = asyncio.create_task(self._beat())
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_INTERVAL)
+            try:
+                await self.touch()
+            except Exception as e:
+                log.warning("heartbeat_failed", kind=self.kind, room=self.room, player=self.player, error=repr(e))
+
+    def stop(self):
+        # The key is left to expire; the sweeper evicts the player unless
+        # another connection for the same player keeps it alive
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def sweep(redis, now=None):
+    """Evict players whose presence expired. Returns [(kind, room, player)]."""
+    now = time.time() if now is None else now
+    await redis.zremrangebyscore(ROOMS_KEY, '-inf', now - ROOM_IDLE_SECONDS)
+
+    evicted = []
+    for member in await redis.zrange(ROOMS_KEY, 0, -1):
+        kind, room = member.split(":", 1)
+        if kind not in _kinds:
+            continue
+        list_players, evict = _kinds[kind]
+
+        players = await list_players(redis, room)
+        if not players:
+            await redis.zrem(ROOMS_KEY, member)
+            continue
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for player in players:
+                pipe.exists(presence_key(kind, room, player))
+            alive = await pipe.execute()
+
+        for player, is_alive in zip(players, alive):
+            if not is_alive:
+                log.info("stale_player_evicted", kind=kind, room=room, player=player)
+                await evict(room, player)
+                evicted.append((kind, room, player))
+    return evicted
+
+
+class Sweeper:
+    def __init__(self, redis):
+        self.redis = redis
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        interval = settings.PRESENCE_SWEEP_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # One worker sweeps per interval
+                if await self.redis.set(SWEEP_LOCK_KEY, 1, nx=True, ex=max(1, int(interval))):
+                    await sweep(self.redis)
+            except Exception as e:
+                log.warning("presence_sweep_failed", error=repr(e))
+
+
+async def start_sweeper():
+    """Make sure this event loop's sweeper is running."""
+    loop = asyncio.get_running_loop()
+    sweeper = _sweepers.get(loop)
+    if sweeper is None:
+        sweeper = Sweeper(await get_redis())
+        _sweepers[loop] = sweeper
+    sweeper.start()
+
+
+async def stop_sweeper():
+    sweeper = _sweepers.pop(asyncio.get_running_loop(), None)
+    if sweeper is not None:
+        await sweeper.stop()
+
+
+lifespan.on_shutdown(stop_sweeper)
@@ -0,0 +1,325 @@
+"""
+Redis-backed state for a story-chain room.
+
+The room is split over four keys instead of one JSON blob:
+
+    story:{room}:meta      HASH  game_id, current_turn_index, current_image_index,
+                                 total_images, turn_seq, evaluating,
+                                 pending_evaluations, scored:{image_index}
+    story:{room}:players   LIST  player names in join order
+    story:{room}:scores    HASH  player -> score
+    story:{room}:sentence  LIST  JSON {"player", "text"} for the current image
+    story:{room}:rounds    LIST  JSON record of each finished round (end-of-game scoring,
+                                 evaluation recovery)
+
+Every state transition is a Lua script, so it is applied atomically and in
+a single round-trip no matter how many sockets or workers act on the room.
+``turn_seq`` increases on every turn change; a timer or submit that carries
+an old sequence number is rejected. ``evaluating`` is set once a sentence
+is complete and blocks contributions until ``complete_round`` runs.
+Rounds are scored afterwards by ``award_round``; ``pending_evaluations``
+counts rounds that are completed but not yet scored, so the game is only
+finished once the last image is done and that count is back at zero.
+
+``game_id`` is minted when the room is created, so a room code that is
+reused after the room emptied or expired starts a new game (and a new
+GameRoom row) instead of continuing the old one.
+"""
+import json
+import uuid
+from collections import namedtuple
+
+ROOM_TTL = 3600  # seconds
+
+_EXPIRE = """
+for i = 1, #KEYS do redis.call('EXPIRE', KEYS[i], ARGV[#ARGV]) end
+"""
+
+# ARGV: player, total_images, new game id, ttl
+JOIN = """
+redis.call('HSETNX', KEYS[1], 'game_id', ARGV[3])
+redis.call('HSETNX', KEYS[1], 'current_turn_index', 0)
+redis.call('HSETNX', KEYS[1], 'current_image_index', 0)
+redis.call('HSETNX', KEYS[1], 'total_images', ARGV[2])
+redis.call('HSETNX', KEYS[1], 'turn_seq', 0)
+redis.call('HSETNX', KEYS[1], 'evaluating', 0)
+redis.call('HSETNX', KEYS[1], 'pending_evaluations', 0)
+local players = redis.call('LRANGE', KEYS[2], 0, -1)
+local added = 1
+for _, p in ipairs(players) do
+    if p == ARGV[1] then added = 0 end
+end
+if added == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    redis.call('HSET', KEYS[3], ARGV[1], 0)
+    table.insert(players, ARGV[1])
+end
+""" + _EXPIRE + """
+return {added, redis.call('HGET', KEYS[1], 'game_id'), unpack(players)}
+"""
+
+# ARGV: ttl
+START_TURN = """
+local n = redis.call('LLEN', KEYS[2])
+if n == 0 then return false end
+local idx = tonumber(redis.call('HGET', KEYS[1], 'current_turn_index') or 0)
+if idx >= n or idx < 0 then
+    idx = 0
+    redis.call('HSET', KEYS[1], 'current_turn_index', 0)
+end
+local seq = redis.call('HINCRBY', KEYS[1], 'turn_seq', 1)
+""" + _EXPIRE + """
+return {redis.call('LINDEX', KEYS[2], idx), seq}
+"""
+
+# ARGV: player ('' = whoever holds the turn), text, score delta,
+#       expected turn_seq ('' = any), ttl
+# Returns {status, player, closed turn_seq[, next player, next turn_seq]}
+CONTRIBUTE = """
+local seq = redis.call('HGET', KEYS[1], 'turn_seq') or '0'
+if redis.call('HGET', KEYS[1], 'evaluating') == '1' then return {'rejected', '', seq} end
+local n = redis.call('LLEN', KEYS[2])
+if n == 0 then return {'rejected', '', seq} end
+local idx = tonumber(redis.call('HGET', KEYS[1], 'current_turn_index') or 0)
+if idx >= n or idx < 0 then
+    idx = 0
+    redis.call('HSET', KEYS[1], 'current_turn_index', 0)
+end
+local current = redis.call('LINDEX', KEYS[2], idx)
+if ARGV[4] ~= '' and seq ~= ARGV[4] then return {'rejected', current, seq} end
+if ARGV[1] ~= '' and current ~= ARGV[1] then return {'rejected', current, seq} end
+redis.call('RPUSH', KEYS[4], cjson.encode({player = current, text = ARGV[2]}))
+redis.call('HINCRBY', KEYS[3], current, ARGV[3])
+""" + _EXPIRE + """
+if idx + 1 >= n then
+    -- every player has had their turn this round
+    redis.call('HSET', KEYS[1], 'evaluating', 1)
+    return {'complete', current, seq}
+end
+idx = (idx + 1) % n
+redis.call('HSET', KEYS[1], 'current_turn_index', idx)
+local next_seq = redis.call('HINCRBY', KEYS[1], 'turn_seq', 1)
+return {'next', current, seq, redis.call('LINDEX', KEYS[2], idx), next_seq}
+"""
+
+# ARGV: expected current_image_index, ttl
+COMPLETE_ROUND = """
+if redis.call('HGET', KEYS[1], 'evaluating') ~= '1' then return false end
+if redis.call('HGET', KEYS[1], 'current_image_index') ~= ARGV[1] then return false end
+local image_index = redis.call('HINCRBY', KEYS[1], 'current_image_index', 1)
+redis.call('DEL', KEYS[4])
+redis.call('HSET', KEYS[1], 'current_turn_index', 0, 'evaluating', 0)
+redis.call('HINCRBY', KEYS[1], 'pending_evaluations', 1)
+""" + _EXPIRE + """
+return {image_index, redis.call('HGET', KEYS[1], 'total_images')}
+"""
+
+# ARGV: image_index, then player/points pairs, ttl
+AWARD_ROUND = """
+if redis.call('HSETNX', KEYS[1], 'scored:' .. ARGV[1], 1) == 0 then return false end
+for i = 2, #ARGV - 1, 2 do
+    redis.call('HINCRBY', KEYS[3], ARGV[i], ARGV[i + 1])
+end
+local pending = redis.call('HINCRBY', KEYS[1], 'pending_evaluations', -1)
+local done = tonumber(redis.call('HGET', KEYS[1], 'current_image_index'))
+    >= tonumber(redis.call('HGET', KEYS[1], 'total_images'))
+""" + _EXPIRE + """
+return {(pending <= 0 and done) and 1 or 0, unpack(redis.call('HGETALL', KEYS[3]))}
+"""
+
+# ARGV: player, ttl
+# Returns {'missing'}, {'empty'} (room deleted), {'complete'} (they were the
+# last to go this round), or {'evicted', turn_changed, player, turn_seq}.
+EVICT = """
+local players = redis.call('LRANGE', KEYS[2], 0, -1)
+local pos = nil
+for i, p in ipairs(players) do
+    if p == ARGV[1] then pos = i - 1 end
+end
+if pos == nil then return {'missing'} end
+redis.call('LREM', KEYS[2], 1, ARGV[1])
+local n = #players - 1
+if n == 0 then
+    redis.call('DEL', unpack(KEYS))
+    return {'empty'}
+end
+""" + _EXPIRE + """
+local idx = tonumber(redis.call('HGET', KEYS[1], 'current_turn_index') or 0)
+local seq = tonumber(redis.call('HGET', KEYS[1], 'turn_seq') or 0)
+local turn_changed = 0
+if pos < idx then
+    idx = idx - 1
+elseif pos == idx and redis.call('HGET', KEYS[1], 'evaluating') ~= '1' then
+    if idx >= n then
+        -- they were the last to go this round
+        redis.call('HSET', KEYS[1], 'evaluating', 1)
+        return {'complete'}
+    end
+    turn_changed = 1
+    seq = redis.call('HINCRBY', KEYS[1], 'turn_seq', 1)
+end
+if idx >= n then idx = 0 end
+redis.call('HSET', KEYS[1], 'current_turn_index', idx)
+return {'evicted', turn_changed, redis.call('LINDEX', KEYS[2], idx), seq}
+"""
+
+# Outcome of a contribution. ``player``/``turn_seq`` describe the turn that was
+# tried (and closed unless rejected); next_* are set when another turn opened.
+TurnResult = namedtuple('TurnResult', 'status player turn_seq next_player next_seq')
+
+
+def _scores(flat):
+    return {flat[i]: int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+
+class StoryRoom:
+    """Atomic operations on one room's state."""
+
+    def __init__(self, redis, room_name, ttl=ROOM_TTL):
+        self.redis = redis
+        self.ttl = ttl
+        self._game_id = None
+        prefix = f"story:{room_name}"
+        self.keys = [
+            f"{prefix}:meta", f"{prefix}:players", f"{prefix}:scores",
+            f"{prefix}:sentence", f"{prefix}:rounds",
+        ]
+        self._join = redis.register_script(JOIN)
+        self._start_turn = redis.register_script(START_TURN)
+        self._contribute = redis.register_script(CONTRIBUTE)
+        self._complete_round = redis.register_script(COMPLETE_ROUND)
+        self._award_round = redis.register_script(AWARD_ROUND)
+        self._evict = redis.register_script(EVICT)
+
+    async def join(self, player, total_images):
+        """Add a player. Returns (added, players)."""
+        added, self._game_id, *players = await self._join(
+            keys=self.keys, args=[player, total_images, uuid.uuid4().hex, self.ttl]
+        )
+        return bool(added), players
+
+    async def game_id(self):
+        """Id of the game being played in the room, or None if the room is gone."""
+        if self._game_id is None:
+            self._game_id = await self.redis.hget(self.keys[0], 'game_id')
+        return self._game_id
+
+    async def start_turn(self):
+        """Open a new turn for the current player. Returns (player, turn_seq) or None."""
+        result = await self._start_turn(keys=self.keys, args=[self.ttl])
+        if not result:
+            return None
+        player, seq = result
+        return player, int(seq)
+
+    async def contribute(self, player, text, points, turn_seq=None):
+        """
+        Append a contribution, add ``points`` and advance the turn.
+
+        Returns a TurnResult with status ``"rejected"`` (not ``player``'s
+        turn, or ``turn_seq`` is no longer open), ``"complete"`` once every
+        player has contributed, or ``"next"``.
+        """
+        expected = '' if turn_seq is None else str(turn_seq)
+        return await self._run_contribute(player, text, points, expected)
+
+    async def expire_turn(self, turn_seq, text, points):
+        """Record ``text``/``points`` for whoever holds turn ``turn_seq``, if it is still open."""
+        return await self._run_contribute('', text, points, str(turn_seq))
+
+    async def _run_contribute(self, player, text, points, expected):
+        result = await self._contribute(keys=self.keys, args=[player, text, points, expected, self.ttl])
+        status, current, seq = result[:3]
+        if status == 'next':
+            return TurnResult(status, current, int(seq), result[3], int(result[4]))
+        return TurnResult(status, current or None, int(seq), None, None)
+
+    async def complete_round(self, image_index):
+        """
+        Close the finished sentence and move to the next image.
+
+        Only the first caller for ``image_index`` wins; later or concurrent
+        callers get None. Returns (next_image_index, total_images).
+        """
+        result = await self._complete_round(keys=self.keys, args=[image_index, self.ttl])
+        if not result:
+            return None
+        return int(result[0]), int(result[1])
+
+    async def award_round(self, image_index, awards):
+        """
+        Add the evaluated points for a completed round, once per round.
+
+        Returns (game_finished, scores), or None if the round was already
+        scored. ``game_finished`` is true for exactly one call per game.
+        """
+        args = [image_index]
+        for player, points in awards.items():
+            args += [player, points]
+        args.append(self.ttl)
+        result = await self._award_round(keys=self.keys, args=args)
+        if not result:
+            return None
+        return bool(result[0]), _scores(result[1:])
+
+    async def evict(self, player):
+        """
+        Remove a player who is gone and keep the turn order consistent.
+
+        Returns (status, next_player, turn_seq): status is ``"missing"``,
+        ``"empty"`` (last player, room deleted), ``"complete"`` (every
+        remaining player has now contributed), ``"turn"`` (they held the
+        turn; ``next_player`` now holds turn ``turn_seq``) or ``"evicted"``.
+        """
+        result = await self._evict(keys=self.keys, args=[player, self.ttl])
+        status = result[0]
+        if status != 'evicted':
+            return status, None, None
+        if int(result[1]):
+            return 'turn', result[2], int(result[3])
+        return status, result[2], int(result[3])
+
+    async def players(self):
+        return await self.redis.lrange(self.keys[1], 0, -1)
+
+    async def log_round(self, record):
+        """Keep a finished round for end-of-game scoring or evaluation recovery."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.keys[4], json.dumps(record, ensure_ascii=False))
+            pipe.expire(self.keys[4], self.ttl)
+            await pipe.execute()
+
+    async def rounds(self):
+        return [json.loads(record) for record in await self.redis.lrange(self.keys[4], 0, -1)]
+
+    async def add_scores(self, deltas):
+        """Apply score corrections atomically. Returns the updated scores."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for player, points in deltas.items():
+                pipe.hincrby(self.keys[2], player, points)
+            pipe.hgetall(self.keys[2])
+            results = await pipe.execute()
+        return {player: int(score) for player, score in results[-1].items()}
+
+    async def snapshot(self):
+        """Consistent read of the whole room, shaped like the legacy JSON state."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.keys[0])
+            pipe.lrange(self.keys[1], 0, -1)
+            pipe.hgetall(self.keys[2])
+            pipe.lrange(self.keys[3], 0, -1)
+            meta, players, scores, sentence = await pipe.execute()
+
+        if not meta:
+            return None
+        return {
+            "current_turn_index": int(meta.get("current_turn_index", 0)),
+            "current_image_index": int(meta.get("current_image_index", 0)),
+            "total_images": int(meta.get("total_images", 0)),
+            "turn_seq": int(meta.get("turn_seq", 0)),
+            "evaluating": meta.get("evaluating") == "1",
+            "pending_evaluations": int(meta.get("pending_evaluations", 0)),
+            "players": players,
+            "scores": {player: int(score) for player, score in scores.items()},
+            "current_sentence": [json.loads(part) for part in sentence],
+        }
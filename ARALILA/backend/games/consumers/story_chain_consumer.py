@@ -1,45 +1,36 @@
 import json
-import asyncio
-from redis import asyncio as aioredis
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.conf import settings
-import os
-from dotenv import load_dotenv
-from openai import AsyncOpenAI 
-from games.data.story_images import story_images
+from backend import metrics
+from backend.log import get_logger
+from . import presence
+from .story_game import StoryGame
+from users.supabase_auth import user_for_token
 
-load_dotenv()
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-async def get_redis():
-    """Singleton Redis connection."""
-    return aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+log = get_logger(__name__)
 
+MESSAGE_TYPES = {"player_join", "submit_sentence", "heartbeat"}
 
 class StoryChainConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"].replace(" ", "_")
         self.room_group_name = f"story_{self.room_name}"
         self.player_name = None
+        self.presence = None
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
-        self.redis = await get_redis()
-        print(f"✅ Player connected to room: {self.room_name}")
+        self.game = await StoryGame.create(self.room_name, self.channel_layer)
+        metrics.connected("story", self.room_name)
+        log.debug("story_connected", room=self.room_name)
 
     async def disconnect(self, close_code):
+        metrics.disconnected("story", self.room_name)
+        if self.presence is not None:
+            self.presence.stop()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-        print(f"🔌 Player disconnected from room: {self.room_name}")
-
-    # -------------------- State Helpers --------------------
-
-    async def get_state(self):
-        data = await self.redis.get(self.room_group_name)
-        return json.loads(data) if data else None
-
-    async def save_state(self, state):
-        await self.redis.set(self.room_group_name, json.dumps(state), ex=3600)
+        log.debug("story_disconnected", room=self.room_name, player=self.player_name, code=close_code)
 
     # -------------------- Message Handling --------------------
 
@@ -49,358 +40,68 @@ class StoryChainConsumer(AsyncWebsocketConsumer):
             msg_type = data.get("type")
             player = data.get("player")
 
-            print(f"📨 Received {msg_type} from {player}")
+            log.debug("ws_message_received", room=self.room_name, type=msg_type, player=player)
 
-            if msg_type == "player_join":
-                await self.handle_player_join(player)
+            # Client-supplied types are not used as labels as-is
+            with metrics.message("story", msg_type if msg_type in MESSAGE_TYPES else "other"):
+                if msg_type == "player_join":
+                    await self.handle_player_join(player, data.get("token"))
 
-            elif msg_type == "submit_sentence":
-                await self.handle_submit_sentence(player, data.get("text", "").strip())
+                elif msg_type == "submit_sentence":
+                    await self.handle_submit_sentence(player, data.get("text", "").strip())
+
+                elif msg_type == "heartbeat":
+                    if self.presence is not None:
+                        await self.presence.touch()
 
         except json.JSONDecodeError as e:
-            print(f"❌ JSON decode error: {e}")
+            log.info("ws_message_invalid", room=self.room_name, error=str(e))
             await self.send(text_data=json.dumps({
                 "type": "error",
                 "message": "Invalid message format"
             }))
         except Exception as e:
-            print(f"❌ Error in receive: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("ws_message_failed", room=self.room_name)
             await self.send(text_data=json.dumps({
                 "type": "error",
                 "message": f"Internal server error: {str(e)}"
             }))
 
-    async def handle_player_join(self, player):
+    async def handle_player_join(self, player, token=None):
         """Handle player joining the game."""
         self.player_name = player
-        state = await self.get_state()
-
-        # Initialize new room state if it doesn't exist
-        if not state:
-            state = {
-                "current_turn_index": 0,
-                "players": [],
-                "scores": {},
-                "current_image_index": 0,
-                "total_images": len(story_images),
-                "current_sentence": [],  # Stores word contributions for current image
-                "timer_task_id": None,
-            }
-
-        # Add player if not already in
-        if player not in state["players"]:
-            state["players"].append(player)
-            state["scores"][player] = 0
-            await self.save_state(state)
-
-            print(f"✅ Player {player} joined. Total players: {len(state['players'])}")
-
-            # Broadcast player list
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {"type": "players_update", "players": state["players"]},
-            )
-
-        # If first player or all 3 players present, start the game
-        if len(state["players"]) == 1 or len(state["players"]) == 3:
-            # Send first image
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "new_image",
-                    "image_index": 0,
-                    "total_images": len(story_images),
-                    "image_url": story_images[0]["url"],
-                    "image_description": story_images[0]["description"],
-                },
-            )
-
-            # Start first turn
-            await self.start_turn(state)
+        user_id = await self.resolve_user_id(token)
+        await self.game.join(player, user_id)
+
+        if self.presence is None:
+            self.presence = presence.Presence(self.game.redis, "story", self.room_name, player)
+            await self.presence.start()
+            await presence.start_sweeper()
+
+    async def resolve_user_id(self, token):
+        """
+        The joining player's account: the Supabase access token sent with
+        ``player_join`` (what the frontend has), else a Django session user.
+        Guests get None and are left out of the multiplayer stats.
+        """
+        if token:
+            user = await database_sync_to_async(user_for_token)(token)
+            if user is None:
+                log.info("ws_token_rejected", room=self.room_name)
+            return user.id if user is not None else None
+        user = self.scope.get("user")
+        return user.id if user is not None and user.is_authenticated else None
 
     async def handle_submit_sentence(self, player, text):
         """Handle player submitting their word/phrase."""
-        if not text:
-            return
-
-        state = await self.get_state()
-        
-        # ✅ FIX: Validate state and players list
-        if not state or not state.get("players") or len(state["players"]) == 0:
-            print(f"⚠️ Invalid state: {state}")
-            return
-
-        # ✅ FIX: Validate current_turn_index is within bounds
-        current_turn_index = state.get("current_turn_index", 0)
-        if current_turn_index >= len(state["players"]):
-            print(f"⚠️ Invalid turn index {current_turn_index}, resetting to 0")
-            current_turn_index = 0
-            state["current_turn_index"] = 0
-            await self.save_state(state)
-
-        # Verify it's this player's turn
-        current_player = state["players"][current_turn_index]
-        if player != current_player:
-            print(f"⚠️ {player} tried to submit but it's {current_player}'s turn")
-            return
-
-        # Add word to current sentence
-        state["current_sentence"].append({"player": player, "text": text})
-        state["scores"][player] = state["scores"].get(player, 0) + 2
-        await self.save_state(state)
-
-        print(f"✅ {player} submitted: {text}")
-
-        # Broadcast update
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "story_update",
-                "player": player,
-                "text": text,
-            },
-        )
-
-        # Check if round is complete (all players have contributed)
-        if len(state["current_sentence"]) >= len(state["players"]):
-            print(f"🔍 All players contributed, evaluating sentence...")
-            await self.evaluate_sentence()
-        else:
-            await self.next_turn()
-
-    # -------------------- Turn Management --------------------
-
-    async def start_turn(self, state):
-        """Start a player's turn with timer."""
-        # ✅ FIX: Validate players list before accessing
-        if not state.get("players") or len(state["players"]) == 0:
-            print("⚠️ Cannot start turn: no players")
-            return
-
-        current_turn_index = state.get("current_turn_index", 0)
-        if current_turn_index >= len(state["players"]):
-            current_turn_index = 0
-            state["current_turn_index"] = 0
-            await self.save_state(state)
-
-        current_player = state["players"][current_turn_index]
-        print(f"🎯 Starting turn for: {current_player}")
-
-        await self.broadcast_turn_update(current_player, 20)
-        
-        # Start timer task
-        asyncio.create_task(self.player_timer(current_player, 20))
-
-    async def next_turn(self):
-        """Move to next player's turn."""
-        state = await self.get_state()
-        
-        # ✅ FIX: Validate state and players
-        if not state or not state.get("players") or len(state["players"]) == 0:
-            print("⚠️ Cannot advance turn: invalid state")
-            return
-
-        current_turn_index = state.get("current_turn_index", 0)
-        state["current_turn_index"] = (current_turn_index + 1) % len(state["players"])
-        await self.save_state(state)
-
-        next_player = state["players"][state["current_turn_index"]]
-        print(f"➡️ Next turn: {next_player}")
-
-        await self.broadcast_turn_update(next_player, 15)
-        asyncio.create_task(self.player_timer(next_player, 15))
-
-    async def broadcast_turn_update(self, player, time_limit):
-        """Broadcast whose turn it is."""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {"type": "turn_update", "next_player": player, "time_limit": time_limit},
-        )
-
-    async def player_timer(self, player, seconds):
-        """Timeout handler - penalize and skip."""
-        await asyncio.sleep(seconds)
-        
-        state = await self.get_state()
-        
-        # ✅ FIX: Validate state before accessing
-        if not state or not state.get("players") or len(state["players"]) == 0:
-            return
-
-        current_turn_index = state.get("current_turn_index", 0)
-        if current_turn_index >= len(state["players"]):
-            return
-
-        # Check if it's still this player's turn
-        current_player = state["players"][current_turn_index]
-        if current_player != player:
-            return  # Turn already changed
-
-        # Penalize
-        state["scores"][player] = state["scores"].get(player, 0) - 2
-        
-        # Add empty contribution to keep sentence formation moving
-        state["current_sentence"].append({"player": player, "text": "[missed turn]"})
-        await self.save_state(state)
-
-        print(f"⏰ {player} timed out!")
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "timeout_event",
-                "player": player,
-                "penalty": 2,
-            },
-        )
-
-        # Check if sentence is complete
-        if len(state["current_sentence"]) >= len(state["players"]):
-            await self.evaluate_sentence()
-        else:
-            await self.next_turn()
-
-    # -------------------- Sentence Evaluation --------------------
-
-    async def evaluate_with_ai(self, sentence, image_description):
-        """Evaluates the sentence using OpenAI."""
-        prompt = f"""
-You are a Filipino language evaluator.
-Evaluate the following Filipino sentence based on:
-1. Grammar correctness
-2. Coherence and flow
-3. Creativity
-4. Relevance to the image description
-
-Image description:
-"{image_description}"
-
-Sentence:
-"{sentence}"
-
-Give a total score from 1 to 20 (just the number, no explanation).
-"""
-
-        try:
-            response = await client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-            )
-
-            text = response.choices[0].message.content.strip()
-            score = int("".join(filter(str.isdigit, text)))
-            return max(1, min(score, 20))
-        except Exception as e:
-            print(f"⚠️ AI evaluation error: {e}")
-            return 10
-
-    async def evaluate_sentence(self):
-        """Evaluate the completed sentence."""
-        state = await self.get_state()
-        
-        # ✅ FIX: Validate state exists
-        if not state:
-            print("⚠️ Cannot evaluate: no state")
-            return
-        
-        # Combine all words into full sentence
-        full_sentence = " ".join([
-            part["text"] for part in state.get("current_sentence", [])
-            if part["text"] != "[missed turn]"
-        ])
-
-        print(f"📝 Evaluating sentence: {full_sentence}")
-
-        # Get current image metadata
-        current_index = state.get("current_image_index", 0)
-        
-        # ✅ FIX: Validate image index
-        if current_index >= len(story_images):
-            print(f"⚠️ Invalid image index: {current_index}")
-            current_index = 0
-            state["current_image_index"] = 0
-        
-        image_data = story_images[current_index]
-        image_description = image_data["description"]
-
-        # AI evaluation
-        group_score = await self.evaluate_with_ai(full_sentence, image_description)
-
-        # Distribute score to players who participated
-        num_participants = sum(1 for part in state.get("current_sentence", []) 
-                              if part["text"] != "[missed turn]")
-        
-        if num_participants > 0:
-            points_per_player = group_score // num_participants
-            for part in state.get("current_sentence", []):
-                if part["text"] != "[missed turn]":
-                    player_name = part["player"]
-                    state["scores"][player_name] = state["scores"].get(player_name, 0) + points_per_player
-
-        await self.save_state(state)
-
-        # Broadcast evaluation
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "sentence_evaluation",
-                "sentence": full_sentence,
-                "score": group_score,
-            },
-        )
-
-        # Reset for next image
-        state["current_image_index"] += 1
-        state["current_sentence"] = []
-        state["current_turn_index"] = 0
-        await self.save_state(state)
-
-        # Check if game is complete
-        if state["current_image_index"] >= state["total_images"]:
-            print(f"🏁 Game complete!")
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "game_complete",
-                    "scores": state["scores"],
-                },
-            )
-        else:
-            # Send next image
-            next_image = story_images[state["current_image_index"]]
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "new_image",
-                    "image_index": state["current_image_index"],
-                    "total_images": len(story_images),
-                    "image_url": next_image["url"],
-                    "image_description": next_image["description"],
-                },
-            )
-            await self.start_turn(state)
+        await self.game.submit(player, text)
 
     # -------------------- WebSocket Broadcasts --------------------
 
-    async def players_update(self, event):
-        await self.send(json.dumps(event))
-
-    async def story_update(self, event):
-        await self.send(json.dumps(event))
-
-    async def turn_update(self, event):
-        await self.send(json.dumps(event))
-
-    async def timeout_event(self, event):
-        await self.send(json.dumps(event))
-
-    async def sentence_evaluation(self, event):
-        await self.send(json.dumps(event))
-
-    async def new_image(self, event):
-        await self.send(json.dumps(event))
-
-    async def game_complete(self, event):
-        await self.send(json.dumps(event))
\ No newline at end of file
+    async def room_message(self, event):
+        """Forward a room broadcast; StoryGame already encoded it once for everyone."""
+        metrics.delivered("story")
+        if event["binary"]:
+            await self.send(bytes_data=event["payload"])
+        else:
+            await self.send(text_data=event["payload"])
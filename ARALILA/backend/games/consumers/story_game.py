@@ -0,0 +1,512 @@
+"""
+Game flow for a story-chain room.
+
+``StoryGame`` holds everything that happens to a room independently of any
+one socket: turns, timeouts, evaluation and broadcasts to the room group.
+``StoryChainConsumer`` creates one per connection for the messages it
+receives, and the per-process turn scheduler creates one when a deadline
+fires, so a turn still times out after the socket that started it is gone.
+
+A finished round moves on to the next image straight away; its sentence is
+scored in the background evaluation pool and ``sentence_evaluation`` is
+broadcast when the score is in. ``game_complete`` follows the last score.
+The pool only lives in this process, so each queued round also gets an
+evaluation deadline: if its job is lost with the worker, the round is
+awarded ``FALLBACK_SCORE`` once ``STORY_EVAL_RECOVERY_AFTER`` has passed.
+With ``STORY_EVAL_MODE = 'end_of_game'`` rounds get a provisional heuristic
+score instead and the whole game is scored in one batch at the end (see
+``story_scoring``).
+
+Joins, finished rounds, scores and results are also appended to a Redis
+stream that ``games.story_persistence`` writes to the database in the
+background.
+"""
+import asyncio
+import time
+import weakref
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from backend import lifespan, metrics
+from backend.log import get_logger
+from games import evaluation_cache, openai_client, prescorer, story_persistence
+from games.codec import get_codec
+from games.data.story_images import story_images
+from games.redis_pool import get_redis
+from . import presence
+from .evaluation_pool import get_evaluation_pool
+from .room_state import StoryRoom
+from . import story_scoring
+from .turn_scheduler import DEADLINES_KEY, TurnScheduler
+
+log = get_logger(__name__)
+
+FIRST_TURN_SECONDS = 20
+NEXT_TURN_SECONDS = 15
+MISSED_TURN_PENALTY = 2
+FALLBACK_SCORE = 10  # used when the LLM fails, times out or the pool is full
+AWARD_ATTEMPTS = 3  # the game only finishes once every round is awarded
+EVALUATION_DEADLINES_KEY = "story:evaluation_deadlines"
+
+# One scheduler per deadline set and event loop (in practice per worker process)
+_schedulers = weakref.WeakKeyDictionary()
+
+
+async def _running_scheduler(key, handler):
+    schedulers = _schedulers.setdefault(asyncio.get_running_loop(), {})
+    scheduler = schedulers.get(key)
+    if scheduler is None:
+        scheduler = TurnScheduler(await get_redis(), handler, key=key)
+        schedulers[key] = scheduler
+    scheduler.start()
+    return scheduler
+
+
+async def get_scheduler():
+    """Running turn scheduler for the current event loop."""
+    return await _running_scheduler(DEADLINES_KEY, expire_turn)
+
+
+async def get_evaluation_deadlines():
+    """Running scheduler for evaluation deadlines (see ``StoryGame.recover_round``)."""
+    return await _running_scheduler(EVALUATION_DEADLINES_KEY, recover_round)
+
+
+async def stop_scheduler():
+    for scheduler in _schedulers.pop(asyncio.get_running_loop(), {}).values():
+        await scheduler.stop()
+
+
+lifespan.on_shutdown(stop_scheduler)
+
+
+def distribute(players, group_score):
+    """Split a round's group score evenly over its contributions."""
+    awards = {}
+    if players:
+        points_per_player = group_score // len(players)
+        for player in players:
+            awards[player] = awards.get(player, 0) + points_per_player
+    return awards
+
+
+async def expire_turn(room_name, turn_seq):
+    """Scheduler callback for a turn deadline."""
+    game = await StoryGame.create(room_name)
+    await game.expire_turn(turn_seq)
+
+
+async def recover_round(room_name, image_index):
+    """Scheduler callback for an evaluation deadline."""
+    game = await StoryGame.create(room_name)
+    await game.recover_round(image_index)
+
+
+async def list_players(redis, room_name):
+    return await StoryRoom(redis, room_name).players()
+
+
+async def evict_player(room_name, player):
+    """Presence callback for a player whose connection is gone."""
+    game = await StoryGame.create(room_name)
+    await game.evict(player)
+
+
+presence.register("story", list_players, evict_player)
+
+
+class StoryGame:
+    def __init__(self, redis, room_name, channel_layer, scheduler, evaluations, evaluation_deadlines):
+        self.room_name = room_name
+        self.room_group_name = f"story_{room_name}"
+        self.redis = redis
+        self.room = StoryRoom(redis, room_name)
+        self.channel_layer = channel_layer
+        self.scheduler = scheduler
+        self.evaluations = evaluations
+        self.evaluation_deadlines = evaluation_deadlines
+
+    @classmethod
+    async def create(cls, room_name, channel_layer=None):
+        return cls(
+            await get_redis(),
+            room_name,
+            channel_layer or get_channel_layer(),
+            await get_scheduler(),
+            get_evaluation_pool(),
+            await get_evaluation_deadlines(),
+        )
+
+    async def broadcast(self, event):
+        """Encode ``event`` once and fan the payload out to the room."""
+        codec = get_codec()
+        payload = codec.encode(event)
+        metrics.broadcast("story", event["type"], len(payload))
+        await self.channel_layer.group_send(self.room_group_name, {
+            "type": "room.message",
+            "payload": payload,
+            "binary": codec.binary,
+        })
+
+    async def get_state(self):
+        return await self.room.snapshot()
+
+    async def record(self, event_type, **data):
+        """Queue an event for the database (see games.story_persistence)."""
+        await story_persistence.emit(self.redis, event_type, self.room_name, await self.room.game_id(), **data)
+
+    # -------------------- Players --------------------
+
+    async def join(self, player, user_id=None):
+        """Handle player joining the game."""
+        added, players = await self.room.join(player, len(story_images))
+
+        if added:
+            log.info("player_joined", room=self.room_name, player=player, players=len(players))
+            await self.record("join", player=player, user_id=user_id)
+
+            # Broadcast player list
+            await self.broadcast({"type": "players_update", "players": players})
+
+        # If first player or all 3 players present, start the game
+        if len(players) == 1 or len(players) == 3:
+            # Send first image
+            await self.broadcast({
+                "type": "new_image",
+                "image_index": 0,
+                "total_images": len(story_images),
+                "image_url": story_images[0]["url"],
+                "image_description": story_images[0]["description"],
+            })
+
+            # Start first turn
+            await self.start_turn()
+
+    async def submit(self, player, text):
+        """Handle player submitting their word/phrase."""
+        if not text:
+            return
+
+        # Turn check, append and score in one atomic step
+        result = await self.room.contribute(player, text, 2)
+        if result.status == "rejected":
+            log.info("submit_out_of_turn", room=self.room_name, player=player, turn=result.player)
+            return
+
+        # Turn ended early; drop its deadline
+        await self.scheduler.cancel(self.room_name, result.turn_seq)
+        log.debug("sentence_submitted", room=self.room_name, player=player)
+
+        # Broadcast update
+        await self.broadcast({
+            "type": "story_update",
+            "player": player,
+            "text": text,
+        })
+
+        # Check if round is complete (all players have contributed)
+        if result.status == "complete":
+            log.debug("round_complete", room=self.room_name)
+            await self.evaluate_sentence()
+        else:
+            await self.announce_turn(result.next_player, result.next_seq, NEXT_TURN_SECONDS)
+
+    async def evict(self, player):
+        """Drop a stale player and hand their turn on if they held it."""
+        status, next_player, turn_seq = await self.room.evict(player)
+        if status == "missing":
+            return
+        if status == "empty":
+            log.info("room_closed", room=self.room_name, reason="empty")
+            return
+
+        await self.broadcast({"type": "players_update", "players": await self.room.players()})
+
+        if status == "complete":
+            await self.evaluate_sentence()
+        elif status == "turn":
+            await self.scheduler.cancel(self.room_name, turn_seq - 1)
+            await self.announce_turn(next_player, turn_seq, NEXT_TURN_SECONDS)
+
+    # -------------------- Turn Management --------------------
+
+    async def start_turn(self):
+        """Start the current player's turn with timer."""
+        turn = await self.room.start_turn()
+        if turn is None:
+            log.warning("turn_not_started", room=self.room_name, reason="no players")
+            return
+
+        current_player, turn_seq = turn
+        if turn_seq > 1:
+            # Restarted (the third player joined): the turn this replaces is closed
+            await self.scheduler.cancel(self.room_name, turn_seq - 1)
+        log.debug("turn_started", room=self.room_name, player=current_player, turn_seq=turn_seq)
+        await self.announce_turn(current_player, turn_seq, FIRST_TURN_SECONDS)
+
+    async def announce_turn(self, player, turn_seq, time_limit):
+        """Broadcast whose turn it is and arm its deadline."""
+        log.debug("turn_announced", room=self.room_name, player=player, turn_seq=turn_seq)
+        await self.scheduler.schedule(self.room_name, turn_seq, time_limit)
+        await self.broadcast({"type": "turn_update", "next_player": player, "time_limit": time_limit})
+
+    async def expire_turn(self, turn_seq):
+        """Timeout handler - penalize and skip."""
+        # Only applies if the turn it was armed for is still open
+        result = await self.room.expire_turn(turn_seq, "[missed turn]", -MISSED_TURN_PENALTY)
+        if result.status == "rejected":
+            return  # Turn already changed
+
+        log.info("turn_timed_out", room=self.room_name, player=result.player, turn_seq=turn_seq)
+
+        await self.broadcast({
+            "type": "timeout_event",
+            "player": result.player,
+            "penalty": MISSED_TURN_PENALTY,
+        })
+
+        # Check if sentence is complete
+        if result.status == "complete":
+            await self.evaluate_sentence()
+        else:
+            await self.announce_turn(result.next_player, result.next_seq, NEXT_TURN_SECONDS)
+
+    # -------------------- Sentence Evaluation --------------------
+
+    async def evaluate_with_ai(self, sentence, image_description):
+        """Evaluates the sentence using OpenAI."""
+        prescored = prescorer.prescore_story(sentence, image_description)
+        if prescored is not None:
+            return prescored
+
+        cached = await evaluation_cache.get('story', (sentence, image_description))
+        if cached is not None:
+            return cached["score"]
+
+        prompt = f"""
+You are a Filipino language evaluator.
+Evaluate the following Filipino sentence based on:
+1. Grammar correctness
+2. Coherence and flow
+3. Creativity
+4. Relevance to the image description
+
+Image description:
+"{image_description}"
+
+Sentence:
+"{sentence}"
+
+Give a total score from 1 to 20 (just the number, no explanation).
+"""
+
+        try:
+            with metrics.timed("story_ai_evaluation"):
+                response = await openai_client.get_client().chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": prompt}],
+                )
+
+            text = response.choices[0].message.content.strip()
+            score = max(1, min(int("".join(filter(str.isdigit, text))), 20))
+        except Exception as e:
+            log.warning("story_evaluation_failed", room=self.room_name, error=repr(e))
+            return FALLBACK_SCORE
+
+        await evaluation_cache.set('story', (sentence, image_description), {"score": score})
+        return score
+
+    async def evaluate_sentence(self):
+        """Close the completed sentence, queue its scoring and move on."""
+        state = await self.get_state()
+
+        # ✅ FIX: Validate state exists
+        if not state:
+            log.warning("round_not_evaluated", room=self.room_name, reason="no state")
+            return
+
+        # Combine all words into full sentence
+        contributions = [
+            part for part in state.get("current_sentence", [])
+            if part["text"] != "[missed turn]"
+        ]
+        full_sentence = " ".join(part["text"] for part in contributions)
+
+        # Get current image metadata
+        current_index = state.get("current_image_index", 0)
+
+        # ✅ FIX: Validate image index
+        image_data = story_images[current_index] if current_index < len(story_images) else story_images[0]
+        image_description = image_data["description"]
+
+        # Move to the next image atomically; only one caller wins
+        result = await self.room.complete_round(current_index)
+        if result is None:
+            log.debug("round_already_closed", room=self.room_name, image_index=current_index)
+            return
+        next_index, total_images = result
+        await self.record(
+            "round_closed",
+            image_index=current_index,
+            image_url=image_data["url"],
+            total_images=total_images,
+            parts=state.get("current_sentence", []),
+            at=time.time(),
+        )
+
+        if settings.STORY_EVAL_MODE == 'end_of_game':
+            # Provisional score now, one batched LLM call once the game is over
+            score = story_scoring.heuristic_score(full_sentence, image_description)
+            await self.room.log_round({
+                "image_index": current_index,
+                "sentence": full_sentence,
+                "image_description": image_description,
+                "players": [part["player"] for part in contributions],
+                "provisional": score,
+            })
+            await self.record_round(current_index, contributions, full_sentence, score, provisional=True)
+        else:
+            # Logged and armed first, so recover_round can still award it if the job is lost
+            await self.room.log_round({
+                "image_index": current_index,
+                "sentence": full_sentence,
+                "image_description": image_description,
+                "players": [part["player"] for part in contributions],
+            })
+            await self.evaluation_deadlines.schedule(self.room_name, current_index, settings.STORY_EVAL_RECOVERY_AFTER)
+            log.debug("evaluation_queued", room=self.room_name, image_index=current_index)
+            queued = self.evaluations.submit(
+                self.score_round, current_index, contributions, full_sentence, image_description
+            )
+            if not queued:
+                log.warning("evaluation_queue_full", room=self.room_name, image_index=current_index, score=FALLBACK_SCORE)
+                await self.record_round(current_index, contributions, full_sentence, FALLBACK_SCORE)
+                await self.evaluation_deadlines.cancel(self.room_name, current_index)
+
+        if next_index < total_images:
+            # Send next image
+            next_image = story_images[next_index]
+            await self.broadcast({
+                "type": "new_image",
+                "image_index": next_index,
+                "total_images": len(story_images),
+                "image_url": next_image["url"],
+                "image_description": next_image["description"],
+            })
+            await self.start_turn()
+
+    async def score_round(self, image_index, contributions, sentence, image_description):
+        """Background job: evaluate one round and record its score."""
+        try:
+            group_score = await asyncio.wait_for(
+                self.evaluate_with_ai(sentence, image_description),
+                timeout=settings.STORY_EVAL_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            log.warning("story_evaluation_timed_out", room=self.room_name, image_index=image_index, timeout=settings.STORY_EVAL_TIMEOUT)
+            group_score = FALLBACK_SCORE
+        except Exception as e:
+            # The round still has to be awarded for the game to finish
+            log.warning("story_evaluation_failed", room=self.room_name, image_index=image_index, error=repr(e))
+            group_score = FALLBACK_SCORE
+
+        await self.record_round(image_index, contributions, sentence, group_score)
+        await self.evaluation_deadlines.cancel(self.room_name, image_index)
+
+    async def recover_round(self, image_index):
+        """Evaluation deadline: award the fallback score if the round is still unscored."""
+        rnd = next((r for r in await self.room.rounds() if r["image_index"] == image_index), None)
+        if rnd is None:
+            return  # room expired
+        contributions = [{"player": player} for player in rnd["players"]]
+        if await self.record_round(image_index, contributions, rnd["sentence"], FALLBACK_SCORE):
+            log.warning("evaluation_recovered", room=self.room_name, image_index=image_index, score=FALLBACK_SCORE)
+
+    async def record_round(self, image_index, contributions, sentence, group_score, provisional=False):
+        """
+        Award a round's score and broadcast it (and the final scores after the
+        last round). Returns False if the round had already been scored.
+        """
+        # Distribute score to players who participated
+        awards = distribute([part["player"] for part in contributions], group_score)
+
+        # Awarding also counts the round off pending_evaluations, so retry transient errors
+        for attempt in range(1, AWARD_ATTEMPTS + 1):
+            try:
+                result = await self.room.award_round(image_index, awards)
+                break
+            except Exception as e:
+                log.warning("round_award_failed", room=self.room_name, image_index=image_index, attempt=attempt, error=repr(e))
+                if attempt == AWARD_ATTEMPTS:
+                    raise
+                await asyncio.sleep(0.1 * attempt)
+        if result is None:
+            return False
+        finished, scores = result
+        await self.record("round_scored", image_index=image_index, sentence=sentence, score=group_score)
+
+        try:
+            # Broadcast evaluation
+            await self.broadcast({
+                "type": "sentence_evaluation",
+                "image_index": image_index,
+                "sentence": sentence,
+                "score": group_score,
+                "provisional": provisional,
+            })
+        finally:
+            # Only this call sees the game finish, so it announces it even if the broadcast failed
+            if finished and not (provisional and self.evaluations.submit(self.score_game, scores)):
+                await self.finish_game(scores)  # otherwise score_game announces it
+        return True
+
+    async def score_game(self, provisional_scores):
+        """Background job: score every round in one batch and correct the provisional scores."""
+        try:
+            scores = await self.correct_scores()
+        except Exception as e:
+            # The game still ends, on the provisional scores
+            log.warning("score_correction_failed", room=self.room_name, error=repr(e))
+            scores = provisional_scores
+        await self.finish_game(scores)
+
+    async def correct_scores(self):
+        """Replace the provisional round scores with the batch evaluation. Returns the new scores."""
+        rounds = await self.room.rounds()
+        try:
+            with metrics.timed("story_batch_evaluation"):
+                final = await asyncio.wait_for(
+                    story_scoring.get_batch_evaluator()(rounds),
+                    timeout=settings.STORY_BATCH_EVAL_TIMEOUT,
+                )
+        except Exception as e:
+            # Includes timeouts; the provisional scores stand
+            log.warning("batch_evaluation_failed", room=self.room_name, error=repr(e))
+            final = [rnd["provisional"] for rnd in rounds]
+
+        deltas = {}
+        for rnd, score in zip(rounds, final):
+            awarded = distribute(rnd["players"], rnd["provisional"])
+            for player, points in distribute(rnd["players"], score).items():
+                deltas[player] = deltas.get(player, 0) + points - awarded[player]
+        scores = await self.room.add_scores(deltas)
+        for rnd, score in zip(rounds, final):
+            await self.record("round_scored", image_index=rnd["image_index"], sentence=rnd["sentence"], score=score)
+
+        await self.broadcast({
+            "type": "final_evaluation",
+            "rounds": [
+                {"image_index": rnd["image_index"], "sentence": rnd["sentence"], "score": score}
+                for rnd, score in zip(rounds, final)
+            ],
+        })
+        return scores
+
+    async def finish_game(self, scores):
+        log.info("game_complete", room=self.room_name)
+        await self.record("game_complete", scores=scores, total_images=len(story_images))
+        await self.broadcast({
+            "type": "game_complete",
+            "scores": scores,
+        })
@@ -0,0 +1,103 @@
+"""
+End-of-game scoring for story-chain rooms (``STORY_EVAL_MODE = 'end_of_game'``).
+
+Each round gets a provisional ``heuristic_score`` as soon as it finishes.
+When the game ends, every round goes to ``STORY_BATCH_EVALUATOR`` in a
+single call, which returns one 1-20 score per round. ``llm_batch_evaluator``
+is the default and uses one structured-output OpenAI request per game.
+``offline_batch_evaluator`` is deterministic and needs no network, for tests
+and local development.
+"""
+import json
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from games import openai_client
+
+MIN_SCORE = 1
+MAX_SCORE = 20
+
+ROUND_SCORES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "scores": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "round": {"type": "integer"},
+                    "score": {"type": "integer"},
+                },
+                "required": ["round", "score"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["scores"],
+    "additionalProperties": False,
+}
+
+
+def clamp(score):
+    return max(MIN_SCORE, min(int(score), MAX_SCORE))
+
+
+def heuristic_score(sentence, image_description):
+    """Quick provisional score from sentence length and word variety."""
+    words = sentence.casefold().split()
+    if not words:
+        return MIN_SCORE
+    variety = len(set(words)) / len(words)
+    return clamp(2 + 2 * min(len(words), 6) * variety)
+
+
+def build_batch_prompt(rounds):
+    sections = []
+    for number, rnd in enumerate(rounds, start=1):
+        sections.append(
+            f'Round {number}\n'
+            f'Image description: "{rnd["image_description"]}"\n'
+            f'Sentence: "{rnd["sentence"]}"'
+        )
+    body = "\n\n".join(sections)
+    return f"""
+You are a Filipino language evaluator.
+Evaluate each Filipino sentence below based on:
+1. Grammar correctness
+2. Coherence and flow
+3. Creativity
+4. Relevance to its image description
+
+{body}
+
+Give each round a total score from 1 to 20.
+"""
+
+
+async def llm_batch_evaluator(rounds):
+    """Score every round in one structured-output request."""
+    response = await openai_client.get_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_batch_prompt(rounds)}],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "round_scores", "strict": True, "schema": ROUND_SCORES_SCHEMA},
+        },
+    )
+    data = json.loads(response.choices[0].message.content)
+    by_round = {item["round"]: item["score"] for item in data["scores"]}
+    # Rounds the model skipped keep their provisional score
+    return [
+        clamp(by_round.get(number, rnd["provisional"]))
+        for number, rnd in enumerate(rounds, start=1)
+    ]
+
+
+async def offline_batch_evaluator(rounds):
+    """Deterministic stand-in for the LLM: the heuristic score of each round."""
+    return [heuristic_score(rnd["sentence"], rnd["image_description"]) for rnd in rounds]
+
+
+def get_batch_evaluator():
+    return import_string(settings.STORY_BATCH_EVALUATOR)
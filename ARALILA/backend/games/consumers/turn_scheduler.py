@@ -0,0 +1,145 @@
+"""
+Turn deadlines for story rooms.
+
+Deadlines live in one Redis sorted set (member ``{room}:{turn_seq}``, score
+= due time), so they belong to the room rather than to the socket that
+armed them. Ending a turn early is a single ZREM; a cancelled deadline is
+never read again.
+
+A due deadline is claimed by moving it, in one script, to a second sorted
+set scored by a lease expiry, so it fires on exactly one worker. The claim
+is dropped once the handler has run; if the worker dies first, the lease
+runs out and the next claim puts the deadline back as due. A deadline
+therefore fires at least once, and the handler ignores a turn that has
+already moved on.
+
+Each worker process runs one loop that sleeps until the earliest deadline
+or lease expiry (or until this process schedules a new one). With nothing
+armed it only wakes every ``IDLE_CHECK`` seconds, to pick up deadlines
+armed by a worker that has since died.
+
+Turn deadlines use ``DEADLINES_KEY``; a scheduler on another key keeps an
+independent set of deadlines (story_game uses one for lost evaluations).
+"""
+import asyncio
+import time
+
+from backend.log import get_logger
+
+log = get_logger(__name__)
+
+DEADLINES_KEY = "story:turn_deadlines"
+CLAIMED_KEY = f"{DEADLINES_KEY}:claimed"
+CLAIM_TIMEOUT = 30  # seconds a claimed deadline may take before it is fired again
+IDLE_CHECK = 30  # longest sleep, seconds
+RETRY_INTERVAL = 1  # seconds, after Redis errors
+BATCH_SIZE = 100
+
+# ARGV: now, lease expiry, batch size
+CLAIM = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZADD', KEYS[1], ARGV[1], member)
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZADD', KEYS[2], ARGV[2], member)
+end
+return due
+"""
+
+
+def _member(room_name, turn_seq):
+    return f"{room_name}:{turn_seq}"
+
+
+class TurnScheduler:
+    """
+    Waits on the deadline set and calls ``handler(room_name, turn_seq)`` for
+    every deadline this process claims.
+    """
+
+    def __init__(self, redis, handler, key=DEADLINES_KEY, claim_timeout=CLAIM_TIMEOUT, idle_check=IDLE_CHECK):
+        self.redis = redis
+        self.handler = handler
+        self.key = key
+        self.claimed_key = f"{key}:claimed"
+        self.claim_timeout = claim_timeout
+        self.idle_check = idle_check
+        self._claim = redis.register_script(CLAIM)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()  # handler tasks, referenced until done
+
+    async def schedule(self, room_name, turn_seq, delay):
+        await self.redis.zadd(self.key, {_member(room_name, turn_seq): time.time() + delay})
+        self._wakeup.set()
+
+    async def cancel(self, room_name, turn_seq):
+        await self.redis.zrem(self.key, _member(room_name, turn_seq))
+
+    async def fire_due(self, now=None):
+        """Claim and fire every deadline due by ``now``. Returns how many fired here."""
+        now = time.time() if now is None else now
+        due = await self._claim(
+            keys=[self.key, self.claimed_key],
+            args=[now, now + self.claim_timeout, BATCH_SIZE],
+        )
+        for member in due:
+            room_name, turn_seq = member.rsplit(":", 1)
+            task = asyncio.create_task(self._fire(room_name, int(turn_seq), member))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return len(due)
+
+    async def next_due(self):
+        """Earliest deadline or claim expiry, or None when nothing is armed."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrange(self.key, 0, 0, withscores=True)
+            pipe.zrange(self.claimed_key, 0, 0, withscores=True)
+            results = await pipe.execute()
+        times = [entries[0][1] for entries in results if entries]
+        return min(times) if times else None
+
+    async def _fire(self, room_name, turn_seq, member):
+        # A cancelled task (shutdown) keeps its claim, so it fires again elsewhere
+        try:
+            await self.handler(room_name, turn_seq)
+        except Exception:
+            log.exception("turn_deadline_failed", room=room_name, turn_seq=turn_seq)
+        try:
+            await self.redis.zrem(self.claimed_key, member)
+        except Exception as e:
+            log.warning("turn_claim_not_released", room=room_name, turn_seq=turn_seq, error=repr(e))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # Cleared before reading, so a schedule() from here on wakes the wait
+            self._wakeup.clear()
+            try:
+                while await self.fire_due() == BATCH_SIZE:
+                    pass
+                next_due = await self.next_due()
+                delay = self.idle_check if next_due is None else next_due - time.time()
+            except Exception as e:
+                log.warning("turn_scheduler_poll_failed", error=repr(e))
+                delay = RETRY_INTERVAL
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), min(max(delay, 0), self.idle_check))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,137 @@
+"""
+LLM evaluation of emoji-challenge answers.
+
+Runs on ``AsyncOpenAI`` so a pending evaluation does not hold a worker
+thread. A per-event-loop semaphore caps concurrent OpenAI calls and every
+evaluation (queueing included) is bounded by ``EMOJI_EVAL_TIMEOUT``; when
+either the limit or the API fails, a fallback result is returned instead.
+Parsed results are shared through ``games.evaluation_cache`` and obviously
+invalid answers are settled by ``games.prescorer`` without an API call.
+"""
+import asyncio
+import json
+import weakref
+
+from django.conf import settings
+
+from backend import metrics
+from backend.log import get_logger
+from . import evaluation_cache, openai_client, prescorer
+from .models import EmojiSymbol
+
+log = get_logger(__name__)
+
+FALLBACK_RESULT = {
+    "valid": False,
+    "explanation": "Hindi masuri ang iyong sagot sa ngayon. Pakisubukang muli.",
+    "corrected": "",
+    "fallback": True,
+}
+
+# One semaphore per event loop (asyncio primitives are loop-bound)
+_limiters = weakref.WeakKeyDictionary()
+
+
+def _limiter():
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = asyncio.Semaphore(settings.EMOJI_EVAL_MAX_CONCURRENCY)
+        _limiters[loop] = limiter
+    return limiter
+
+
+def build_prompt(student_answer, emojis):
+    return f"""
+        You are a Filipino language teacher.
+        Keywords shown to the student: {emojis}
+        Student's sentence: "{student_answer}"
+
+        The student's answer must be pure Filipino text (no emojis).
+
+        Please:
+        1. Check if it is grammatically correct in Filipino.
+        2. Check if the meaning matches the given key concepts ({emojis}).
+        It is acceptable if not every keyword is mentioned literally, as long as the main idea is correct.
+        3. Give a short explanation (in Filipino) about what is right or wrong.
+        4. Provide a corrected version if needed.
+
+        Respond ONLY in valid JSON with keys:
+        valid (true/false), explanation (string), corrected (string).
+        """
+
+
+def parse_result(raw_text):
+    """Parsed JSON result, or None when the model did not return valid JSON."""
+    try:
+        # remove code fences if present
+        cleaned = raw_text.strip().replace("```json", "").replace("```", "").strip()
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        return None
+
+
+async def _call_llm(student_answer, emojis):
+    async with _limiter():
+        with metrics.timed("emoji_ai_evaluation"):
+            response = await openai_client.get_client().chat.completions.create(
+                model="gpt-4o-mini",   # 💡 you can also use gpt-5-mini if available
+                messages=[
+                    {"role": "system", "content": "You are a helpful teacher."},
+                    {"role": "user", "content": build_prompt(student_answer, emojis)}
+                ]
+            )
+    return response.choices[0].message.content
+
+
+async def keywords_for(emojis):
+    """
+    Filipino keywords for the prompt: ``EmojiSymbol.keyword`` of each emoji
+    symbol, and entries that are already words (the challenge sends its
+    keywords) as they are.
+    """
+    words = [str(emoji) for emoji in emojis if prescorer.tokens(str(emoji))]
+    symbols = [str(emoji) for emoji in emojis if not prescorer.tokens(str(emoji))]
+    if symbols:
+        try:
+            words += [
+                keyword async for keyword in
+                EmojiSymbol.objects.filter(symbol__in=symbols).values_list('keyword', flat=True).distinct()
+            ]
+        except Exception as e:
+            log.warning("emoji_keywords_failed", error=repr(e))
+    return words
+
+
+async def evaluate(student_answer, emojis):
+    """Evaluate one answer; never raises, falls back on timeout or API errors."""
+    prescored = prescorer.prescore_emoji(student_answer, await keywords_for(emojis))
+    if prescored is not None:
+        return prescored
+
+    cached = await evaluation_cache.get('emoji', (emojis, student_answer))
+    if cached is not None:
+        return cached
+
+    try:
+        raw_text = await asyncio.wait_for(
+            _call_llm(student_answer, emojis),
+            timeout=settings.EMOJI_EVAL_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        log.warning("emoji_evaluation_timed_out", timeout=settings.EMOJI_EVAL_TIMEOUT)
+        return dict(FALLBACK_RESULT)
+    except Exception as e:
+        log.warning("emoji_evaluation_failed", error=repr(e))
+        return dict(FALLBACK_RESULT)
+
+    result = parse_result(raw_text)
+    if result is None:
+        return {
+            "valid": False,
+            "explanation": "AI did not return valid JSON.",
+            "corrected": raw_text
+        }
+
+    await evaluation_cache.set('emoji', (emojis, student_answer), result)
+    return result
@@ -0,0 +1,104 @@
+"""
+Content-addressed cache for LLM evaluation results.
+
+Inputs are normalized (case-folded, whitespace collapsed) and hashed, so
+identical or trivially different answers share one entry. Entries live in
+Redis with ``EVALUATION_CACHE_TTL``; each namespace also keeps a sorted set
+of last-access times and the least recently used entries are evicted once
+it grows past ``EVALUATION_CACHE_MAX_ENTRIES``. Redis errors, and reads or
+writes slower than ``EVALUATION_CACHE_TIMEOUT``, count as misses so
+evaluation never depends on the cache being up or eats into its deadline.
+"""
+import asyncio
+import hashlib
+import json
+import time
+
+from django.conf import settings
+
+from backend import metrics
+from backend.log import get_logger
+from .redis_pool import get_redis
+
+log = get_logger(__name__)
+
+_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+
+def normalize(value):
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return " ".join(str(value).casefold().split())
+
+
+def fingerprint(parts):
+    normalized = json.dumps(normalize(parts), ensure_ascii=False)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _keys(namespace, parts):
+    fp = fingerprint(parts)
+    return fp, f"evalcache:{namespace}:{fp}", f"evalcache:{namespace}:lru"
+
+
+async def get(namespace, parts):
+    """Cached result for ``parts`` or None."""
+    fp, key, index = _keys(namespace, parts)
+    try:
+        raw = await asyncio.wait_for(_read(fp, key, index), settings.EVALUATION_CACHE_TIMEOUT)
+    except Exception as e:
+        log.warning("evaluation_cache_read_failed", namespace=namespace, error=repr(e))
+        _stats['errors'] += 1
+        _stats['misses'] += 1
+        metrics.cache_lookup(False)
+        return None
+
+    if raw is None:
+        _stats['misses'] += 1
+        metrics.cache_lookup(False)
+        return None
+    _stats['hits'] += 1
+    metrics.cache_lookup(True)
+    return json.loads(raw)
+
+
+async def _read(fp, key, index):
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.get(key)
+        pipe.zadd(index, {fp: time.time()}, xx=True)  # touch only if already indexed
+        raw, _ = await pipe.execute()
+    return raw
+
+
+async def set(namespace, parts, result):
+    """Store ``result`` and evict the least recently used overflow."""
+    try:
+        await asyncio.wait_for(_write(namespace, parts, result), settings.EVALUATION_CACHE_TIMEOUT)
+    except Exception as e:
+        log.warning("evaluation_cache_write_failed", namespace=namespace, error=repr(e))
+        _stats['errors'] += 1
+
+
+async def _write(namespace, parts, result):
+    fp, key, index = _keys(namespace, parts)
+    max_entries = settings.EVALUATION_CACHE_MAX_ENTRIES
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(key, json.dumps(result, ensure_ascii=False), ex=settings.EVALUATION_CACHE_TTL)
+        pipe.zadd(index, {fp: time.time()})
+        pipe.zcard(index)
+        _, _, size = await pipe.execute()
+
+    if size > max_entries:
+        evicted = await redis.zpopmin(index, size - max_entries)
+        if evicted:
+            await redis.delete(*[f"evalcache:{namespace}:{member}" for member, _ in evicted])
+
+
+def stats():
+    lookups = _stats['hits'] + _stats['misses']
+    return {
+        **_stats,
+        'hit_rate': round(_stats['hits'] / lookups, 3) if lookups else 0.0,
+    }
@@ -0,0 +1,98 @@
+import json
+import time
+
+import msgpack
+from django.core.management.base import BaseCommand
+
+from games.codec import CODECS
+from games.data.story_images import story_images
+
+SAMPLE_EVENTS = [
+    {"type": "story_update", "player": "Maria", "text": "Naglaro ang mga bata"},
+    {"type": "turn_update", "next_player": "Juan", "time_limit": 15},
+    {
+        "type": "new_image",
+        "image_index": 1,
+        "total_images": len(story_images),
+        "image_url": story_images[1]["url"],
+        "image_description": story_images[1]["description"],
+    },
+    {
+        "type": "sentence_evaluation",
+        "image_index": 0,
+        "sentence": "Nagtanim ng puno ang mga iskawt sa paaralan.",
+        "score": 16,
+        "provisional": False,
+    },
+    {"type": "game_complete", "scores": {"Maria": 48, "Juan": 41, "Ana": 39}},
+]
+
+
+def layer_roundtrip(message, channel):
+    # What channels_redis does for every channel in a group: pack, push, unpack
+    data = msgpack.packb({**message, "__asgi_channel__": channel}, use_bin_type=True)
+    return data, msgpack.unpackb(data, raw=False)
+
+
+def legacy_broadcast(event, channels):
+    """Raw event through the layer, json.dumps in every consumer."""
+    layer_bytes = wire_bytes = 0
+    for channel in channels:
+        data, received = layer_roundtrip(event, channel)
+        received.pop("__asgi_channel__")
+        frame = json.dumps(received)
+        layer_bytes += len(data)
+        wire_bytes += len(frame.encode("utf-8"))
+    return layer_bytes, wire_bytes
+
+
+def encoded_broadcast(codec, event, channels):
+    """Encoded once by the sender; consumers forward the payload."""
+    payload = codec.encode(event)
+    message = {"type": "room.message", "payload": payload, "binary": codec.binary}
+    layer_bytes = wire_bytes = 0
+    for channel in channels:
+        data, received = layer_roundtrip(message, channel)
+        frame = received["payload"]
+        layer_bytes += len(data)
+        wire_bytes += len(frame) if codec.binary else len(frame.encode("utf-8"))
+    return layer_bytes, wire_bytes
+
+
+class Command(BaseCommand):
+    help = 'Compare bytes and CPU per story-chain broadcast: legacy JSON vs encode-once codecs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=3)
+        parser.add_argument('--iterations', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        channels = [f"specific.abc123!{n:024x}" for n in range(options['recipients'])]
+        iterations = options['iterations']
+
+        paths = [("legacy json", legacy_broadcast)]
+        for name, codec in CODECS.items():
+            paths.append((f"encode-once {name}", lambda event, channels, codec=codec: encoded_broadcast(codec, event, channels)))
+
+        self.stdout.write(
+            f"📊 {len(SAMPLE_EVENTS)} event types, {len(channels)} recipients, {iterations} iterations each\n"
+        )
+        self.stdout.write(f"{'path':<22}{'layer B':>10}{'wire B':>10}{'µs/broadcast':>15}")
+        for name, broadcast in paths:
+            layer_bytes = wire_bytes = 0
+            for event in SAMPLE_EVENTS:
+                layer, wire = broadcast(event, channels)
+                layer_bytes += layer
+                wire_bytes += wire
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for event in SAMPLE_EVENTS:
+                    broadcast(event, channels)
+            elapsed = time.perf_counter() - start
+            per_broadcast = elapsed / (iterations * len(SAMPLE_EVENTS)) * 1e6
+
+            count = len(SAMPLE_EVENTS)
+            self.stdout.write(
+                f"{name:<22}{layer_bytes / count:>10.0f}{wire_bytes / count:>10.0f}{per_broadcast:>15.1f}"
+            )
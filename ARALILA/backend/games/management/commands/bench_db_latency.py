@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+MODES = ('per_request', 'persistent', 'pool')
+
+
+def configure(mode):
+    """Point the default connection at ``mode``, dropping any open connection or pool."""
+    connection.close()
+    if getattr(connection, 'pool', None):
+        connection.close_pool()
+
+    settings_dict = connection.settings_dict
+    settings_dict['OPTIONS'].pop('pool', None)
+    settings_dict['CONN_MAX_AGE'] = 0
+    settings_dict['CONN_HEALTH_CHECKS'] = False
+    if mode == 'persistent':
+        settings_dict['CONN_MAX_AGE'] = settings.DB_CONN_MAX_AGE
+        settings_dict['CONN_HEALTH_CHECKS'] = True
+    elif mode == 'pool':
+        settings_dict['OPTIONS']['pool'] = dict(settings.DB_POOL_OPTIONS)
+        settings_dict['CONN_HEALTH_CHECKS'] = True
+
+
+def simulated_request(queries):
+    # The same connection handling Django does around a real request
+    request_started.send(sender=None)
+    try:
+        with connection.cursor() as cursor:
+            for _ in range(queries):
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+    finally:
+        request_finished.send(sender=None)
+
+
+class Command(BaseCommand):
+    help = 'Per-request database latency for each DB_CONN_MODE against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--queries', type=int, default=3, help='Queries per request')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **options):
+        original = {
+            'OPTIONS': dict(connection.settings_dict['OPTIONS']),
+            'CONN_MAX_AGE': connection.settings_dict['CONN_MAX_AGE'],
+            'CONN_HEALTH_CHECKS': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        }
+        self.stdout.write(
+            f"📊 {connection.vendor} {connection.settings_dict.get('HOST') or connection.settings_dict['NAME']}, "
+            f"{options['requests']} requests x {options['queries']} queries (configured: {settings.DB_CONN_MODE})\n"
+        )
+        self.stdout.write(f"{'mode':<14}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+
+        try:
+            for mode in options['modes']:
+                if mode == 'pool' and not self.pool_supported():
+                    self.stdout.write(f"{mode:<14}  skipped: needs PostgreSQL with psycopg[pool]")
+                    continue
+                configure(mode)
+                timings = []
+                for _ in range(options['requests']):
+                    start = time.perf_counter()
+                    simulated_request(options['queries'])
+                    timings.append((time.perf_counter() - start) * 1000)
+                self.report(mode, timings)
+        finally:
+            configure('per_request')
+            connection.settings_dict.update(original)
+
+    def pool_supported(self):
+        if connection.vendor != 'postgresql':
+            return False
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return is_psycopg3
+
+    def report(self, mode, timings):
+        steady = timings[1:] or timings
+        p95 = statistics.quantiles(steady, n=20)[-1] if len(steady) > 1 else steady[0]
+        self.stdout.write(
+            f"{mode:<14}{timings[0]:>10.2f}{statistics.median(steady):>10.2f}"
+            f"{p95:>10.2f}{statistics.mean(steady):>10.2f}"
+        )
@@ -0,0 +1,86 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TARGETS = {
+    'settings': "import backend.settings",
+    'setup': "import django; django.setup()",
+    'asgi': "import backend.asgi",
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)")
+
+
+def measure(code, env):
+    """Wall time and ``-X importtime`` report of ``code`` in a fresh interpreter."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise CommandError(result.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            modules.append({
+                'module': name,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+            })
+    return wall, modules
+
+
+class Command(BaseCommand):
+    help = 'Import-time profile of worker startup (python -X importtime), for tracking in CI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=TARGETS, default='asgi')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters; the fastest run is reported')
+        parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list')
+        parser.add_argument('--json', action='store_true', help='Machine-readable output')
+        parser.add_argument('--budget-ms', type=float, help='Fail when the wall time exceeds this')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+        runs = [measure(TARGETS[options['target']], env) for _ in range(options['runs'])]
+        wall, modules = min(runs, key=lambda run: run[0])
+
+        # Self time summed per top-level package: what each dependency costs
+        packages = {}
+        for m in modules:
+            package = m['module'].split('.')[0]
+            packages[package] = packages.get(package, 0) + m['self_ms']
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+        report = {
+            'target': options['target'],
+            'wall_ms': round(wall * 1000, 1),
+            'import_ms': round(sum(m['self_ms'] for m in modules), 1),
+            'modules': len(modules),
+            'slowest': [{'package': name, 'ms': round(ms, 1)} for name, ms in slowest],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(
+                f"📊 {report['target']}: {report['wall_ms']:.1f}ms wall, {report['import_ms']:.1f}ms importing "
+                f"{report['modules']} modules (best of {options['runs']})\n"
+            )
+            self.stdout.write(f"{'package':<30}{'ms':>10}")
+            for entry in report['slowest']:
+                self.stdout.write(f"{entry['package']:<30}{entry['ms']:>10.1f}")
+
+        budget = options['budget_ms']
+        if budget is not None and report['wall_ms'] > budget:
+            raise CommandError(f"startup took {report['wall_ms']:.1f}ms, budget is {budget:.0f}ms")
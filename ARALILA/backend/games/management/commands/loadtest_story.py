@@ -0,0 +1,254 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from games.codec import CODECS
+
+WORDS = ["Ang", "mga", "bata", "ay", "naglaro", "sa", "parke", "masaya", "kami", "ng", "bola", "puno"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []   # submit_sentence -> own story_update, seconds
+        self.lobby_waits = []  # lobby connect -> game_start, seconds
+        self.fanout = {}      # broadcast key -> receive times across recipients
+        self.errors = []
+        self.sent = 0
+        self.received = 0
+        self.games_completed = 0
+
+    def error(self, message):
+        self.errors.append(message)
+
+
+class InProcessConnection:
+    """Talks to the ASGI app directly through channels' test communicator."""
+
+    def __init__(self, application, path):
+        from channels.testing import WebsocketCommunicator
+        self.communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise ConnectionError("handshake rejected")
+
+    async def send(self, message):
+        await self.communicator.send_to(text_data=json.dumps(message))
+
+    async def receive(self, timeout):
+        output = await self.communicator.receive_output(timeout)
+        if output["type"] == "websocket.close":
+            raise ConnectionError(f"closed by server ({output.get('code')})")
+        if output.get("bytes") is not None:
+            return CODECS["msgpack"].decode(output["bytes"])
+        return json.loads(output["text"])
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class RemoteConnection:
+    """Talks to a running server over a real WebSocket."""
+
+    def __init__(self, base_url, path):
+        self.url = base_url.rstrip("/") + "/" + path
+
+    async def connect(self):
+        import websockets
+        self.socket = await websockets.connect(self.url)
+
+    async def send(self, message):
+        await self.socket.send(json.dumps(message))
+
+    async def receive(self, timeout):
+        frame = await asyncio.wait_for(self.socket.recv(), timeout)
+        if isinstance(frame, bytes):
+            return CODECS["msgpack"].decode(frame)
+        return json.loads(frame)
+
+    async def close(self):
+        await self.socket.close()
+
+
+class Command(BaseCommand):
+    help = 'Simulate N story-chain rooms x 3 players over the lobby and story WebSocket protocols'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10)
+        parser.add_argument('--players', type=int, default=3, help='Players per room')
+        parser.add_argument('--think-time', type=float, default=0.5,
+                            help='Mean seconds a player waits before submitting (uniform 0.5x-1.5x)')
+        parser.add_argument('--llm-latency', type=float, default=0.5,
+                            help='Seconds the stubbed OpenAI call takes (in-process only)')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for any one message')
+        parser.add_argument('--url', help='ws://host:port of a running server; default runs the app in-process')
+        parser.add_argument('--channel-layer', choices=['memory', 'redis'], default='memory',
+                            help='In-process channel layer')
+        parser.add_argument('--fake-redis', action='store_true',
+                            help='In-process: keep room state in fakeredis instead of REDIS_URL')
+
+    def handle(self, *args, **options):
+        self.options = options
+        stats = Stats()
+        started = time.perf_counter()
+        asyncio.run(self.run(stats))
+        self.report(stats, time.perf_counter() - started)
+
+    # -------------------- Setup --------------------
+
+    async def run(self, stats):
+        options = self.options
+        if options['url']:
+            connect = lambda path: RemoteConnection(options['url'], path)
+            await self.run_rooms(stats, connect)
+            return
+
+        from channels.layers import channel_layers
+        from channels.routing import URLRouter
+        from games import openai_client, redis_pool
+        from games.consumers import story_game
+        from games.routing import websocket_urlpatterns
+
+        if options['channel_layer'] == 'memory':
+            settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+            channel_layers.backends = {}
+        if options['fake_redis']:
+            import fakeredis
+            from redis.asyncio import BlockingConnectionPool
+            # Same bounded, blocking pool as games.redis_pool
+            redis_pool._clients[asyncio.get_running_loop()] = fakeredis.FakeAsyncRedis(
+                decode_responses=True,
+                connection_pool_class=BlockingConnectionPool,
+                max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+            )
+
+        application = URLRouter(websocket_urlpatterns)
+        connect = lambda path: InProcessConnection(application, path)
+
+        async def fake_completion(**kwargs):
+            await asyncio.sleep(options['llm_latency'])
+            message = SimpleNamespace(content=str(random.randint(8, 18)))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_completion)))
+        with mock.patch.object(openai_client, 'get_client', return_value=client):
+            await self.run_rooms(stats, connect)
+            await story_game.stop_scheduler()
+
+    async def run_rooms(self, stats, connect):
+        run_id = uuid.uuid4().hex[:8]
+        await asyncio.gather(*[
+            self.run_room(stats, connect, f"load{run_id}{number}")
+            for number in range(self.options['rooms'])
+        ])
+
+    # -------------------- One room --------------------
+
+    async def run_room(self, stats, connect, room):
+        names = [f"{room}p{n}" for n in range(self.options['players'])]
+        await asyncio.gather(*[self.lobby(stats, connect, room, name) for name in names])
+        results = await asyncio.gather(
+            *[self.play(stats, connect, room, name) for name in names], return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                stats.error(f"{room}: {result!r}")
+
+    async def lobby(self, stats, connect, room, name):
+        connection = connect(f"ws/lobby/{room}/?player={name}")
+        started = time.perf_counter()
+        try:
+            await connection.connect()
+            while True:
+                message = await connection.receive(self.options['timeout'])
+                stats.received += 1
+                if message["type"] == "game_start":
+                    stats.lobby_waits.append(time.perf_counter() - started)
+                    return
+        except Exception as e:
+            stats.error(f"lobby {name}: {e!r}")
+        finally:
+            await connection.close()
+
+    async def play(self, stats, connect, room, name):
+        connection = connect(f"ws/story/{room}/")
+        await connection.connect()
+        try:
+            await connection.send({"type": "player_join", "player": name})
+            stats.sent += 1
+            submitted_at = {}
+            counter = 0
+
+            while True:
+                message = await connection.receive(self.options['timeout'])
+                stats.received += 1
+                now = time.perf_counter()
+                kind = message.get("type")
+
+                if kind == "error":
+                    stats.error(f"{name}: {message.get('message')}")
+                elif kind == "story_update":
+                    key = (room, message["player"], message["text"])
+                    stats.fanout.setdefault(key, []).append(now)
+                    if message["player"] == name and message["text"] in submitted_at:
+                        stats.latencies.append(now - submitted_at.pop(message["text"]))
+                elif kind == "turn_update" and message["next_player"] == name:
+                    think = self.options['think_time'] * random.uniform(0.5, 1.5)
+                    await asyncio.sleep(think)
+                    counter += 1
+                    text = f"{random.choice(WORDS)}{counter}"
+                    submitted_at[text] = time.perf_counter()
+                    await connection.send({"type": "submit_sentence", "player": name, "text": text})
+                    stats.sent += 1
+                elif kind == "game_complete":
+                    stats.games_completed += 1
+                    return
+        finally:
+            await connection.close()
+
+    # -------------------- Report --------------------
+
+    def report(self, stats, elapsed):
+        players = self.options['players']
+        fanout = [max(times) - min(times) for times in stats.fanout.values() if len(times) == players]
+        rooms = self.options['rooms']
+
+        self.stdout.write(f"🏁 {rooms} rooms x {players} players in {elapsed:.1f}s")
+        self.stdout.write(f"   games completed: {stats.games_completed // players}/{rooms}")
+        self.stdout.write(
+            f"   messages: {stats.sent} sent, {stats.received} received "
+            f"({stats.received / elapsed:.0f}/s)"
+        )
+        for label, values in (
+            ("submit -> story_update", stats.latencies),
+            ("broadcast fan-out", fanout),
+            ("lobby -> game_start", stats.lobby_waits),
+        ):
+            self.stdout.write(
+                f"   {label:<24} n={len(values):<6} "
+                f"p50={percentile(values, 50) * 1000:7.1f}ms "
+                f"p95={percentile(values, 95) * 1000:7.1f}ms "
+                f"p99={percentile(values, 99) * 1000:7.1f}ms"
+            )
+
+        style = self.style.ERROR if stats.errors else self.style.SUCCESS
+        self.stdout.write(style(f"   errors: {len(stats.errors)}"))
+        for error in stats.errors[:10]:
+            self.stdout.write(f"     - {error}")
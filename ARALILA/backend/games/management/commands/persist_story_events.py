@@ -0,0 +1,46 @@
+import socket
+
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from games import story_persistence
+
+
+class Command(BaseCommand):
+    help = 'Write story-chain room events from the Redis stream to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default=socket.gethostname(),
+                            help='Consumer name within the persister group (one per process)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--block', type=int, default=5000,
+                            help='Milliseconds to wait for new events')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain what is queued and exit instead of running forever')
+
+    def handle(self, *args, **options):
+        client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        story_persistence.ensure_group(client)
+        consumer = options['consumer']
+        batch_size = options['batch_size']
+
+        # Events delivered to this consumer before a crash but never acked
+        total = 0
+        while True:
+            count = story_persistence.drain(client, consumer, batch_size, pending=True)
+            if not count:
+                break
+            total += count
+
+        self.stdout.write(f"📥 Persisting story events as '{consumer}'")
+        while True:
+            block = None if options['once'] else options['block']
+            count = story_persistence.drain(client, consumer, batch_size, block=block)
+            total += count
+            if count:
+                self.stdout.write(f"💾 Persisted {count} events ({total} total)")
+            elif options['once']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Persisted {total} events"))
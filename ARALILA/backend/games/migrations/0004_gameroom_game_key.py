@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+def key_existing_rooms(apps, schema_editor):
+    # Events recorded before game ids existed are keyed by room code
+    GameRoom = apps.get_model('games', 'GameRoom')
+    GameRoom.objects.update(game_key=models.F('room_name'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0003_gameplayer_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='game_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='gameroom',
+            name='room_name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.RunPython(key_existing_rooms, migrations.RunPython.noop),
+    ]
@@ -202,7 +202,10 @@ class GameRoom(models.Model):
         blank=True, 
         related_name='multiplayer_rooms'
     )
-    room_name = models.CharField(max_length=100, unique=True)
+    # Room codes are reused; each game played under one gets its own row,
+    # keyed by the id StoryRoom mints for it
+    room_name = models.CharField(max_length=100, db_index=True)
+    game_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default="active")
     total_images = models.PositiveIntegerField(default=5)
@@ -215,7 +218,9 @@ class GameRoom(models.Model):
 
 class GamePlayer(models.Model):
     room = models.ForeignKey(GameRoom, on_delete=models.CASCADE, related_name="players")
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Story-chain players join by display name; user is set when the socket was authenticated
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    name = models.CharField(max_length=100, blank=True, default="")
     score = models.IntegerField(default=0)
     joined_at = models.DateTimeField(auto_now_add=True)
 
@@ -0,0 +1,37 @@
+"""
+Shared ``AsyncOpenAI`` client.
+
+Nothing is constructed at import time; the client is built on first use so
+importing views, consumers or management commands costs nothing and needs
+no API key. Its HTTP connection pool belongs to the event loop that opened
+it, so there is one client per running loop, like ``games.redis_pool``.
+``close()`` runs on server shutdown (``backend.lifespan``).
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+
+from backend import lifespan
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Shared OpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        _clients[loop] = client
+    return client
+
+
+async def close():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+lifespan.on_shutdown(close)
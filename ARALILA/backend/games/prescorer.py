@@ -0,0 +1,120 @@
+"""
+Local pre-scoring of answers before they go to the LLM.
+
+Looks at token count, repeated tokens, overlap with the expected keywords
+and the share of common Filipino and English function words. Obvious cases
+(nothing written, a single word, the same word over and over, an English
+answer) are settled here without a network call. A sentence is only taken
+as "not Filipino" when it has no Filipino function words, none of the
+expected keywords and does have English ones: short Filipino sentences
+often drop the function words ("Umuulan kahapon"). For everything else the
+functions return None and the caller escalates to the LLM. ``stats()``
+counts how many LLM calls this saved.
+"""
+import re
+
+# Common Filipino function words; real Filipino sentences almost always contain some
+FILIPINO_STOP_WORDS = frozenset("""
+    ang ng sa mga si ni kay sina nina kina at ay na nang pa rin din lang lamang
+    ba po ho ko mo niya namin natin ninyo nila ako ikaw ka siya kami tayo kayo
+    sila ito iyan iyon dito diyan doon may mayroon wala hindi huwag para kung
+    kapag dahil pero ngunit o upang tulad gaya habang noon ngayon bukas kanina
+    ating aming kanilang kaniyang kanyang akin iyo kanila amin atin
+""".split())
+
+# English function words that are not also Filipino words (so no "at", "may", "o")
+ENGLISH_STOP_WORDS = frozenset("""
+    the a an is are was were be been being am of to in on for with from by
+    and or but this that these those it its he she they we you i me my his
+    her their our your them him us has have had do does did not will would
+    can could should there here what when where who which very
+""".split())
+FOREIGN_RATIO = 0.2  # share of English function words that marks an answer as English
+
+MIN_STORY_SCORE = 1
+
+_WORD = re.compile(r"[^\W\d_]+(?:[-'][^\W\d_]+)*")
+
+_stats = {
+    'story': {'saved': 0, 'escalated': 0},
+    'emoji': {'saved': 0, 'escalated': 0},
+}
+
+
+def tokens(text):
+    return [token.casefold() for token in _WORD.findall(text or "")]
+
+
+def analyze(text, keywords=()):
+    """Token-level features of ``text`` against an iterable of expected keywords."""
+    words = tokens(text)
+    keyword_tokens = {token for keyword in keywords for token in tokens(keyword)}
+    count = len(words)
+    return {
+        'token_count': count,
+        'unique_ratio': len(set(words)) / count if count else 0.0,
+        'keyword_overlap': len(set(words) & keyword_tokens),
+        'stopword_ratio': sum(1 for w in words if w in FILIPINO_STOP_WORDS) / count if count else 0.0,
+        'foreign_ratio': sum(1 for w in words if w in ENGLISH_STOP_WORDS) / count if count else 0.0,
+    }
+
+
+def looks_foreign(features):
+    """No Filipino function word or expected keyword, but English ones."""
+    return (
+        features['stopword_ratio'] == 0
+        and features['keyword_overlap'] == 0
+        and features['foreign_ratio'] >= FOREIGN_RATIO
+    )
+
+
+def _settle(kind, result):
+    _stats[kind]['escalated' if result is None else 'saved'] += 1
+    return result
+
+
+def prescore_story(sentence, image_description):
+    """Score (1-20) for an obviously weak story sentence, or None to ask the LLM."""
+    # The descriptions are in English, so they are not expected keywords
+    features = analyze(sentence)
+    count = features['token_count']
+
+    if count == 0:
+        score = MIN_STORY_SCORE  # everybody missed their turn
+    elif count == 1:
+        score = 2
+    elif count >= 3 and features['unique_ratio'] <= 0.5:
+        score = 2  # the same word repeated
+    elif count >= 3 and looks_foreign(features):
+        score = 3  # written in English
+    else:
+        score = None
+    return _settle('story', score)
+
+
+def _invalid(explanation):
+    return {"valid": False, "explanation": explanation, "corrected": "", "prescored": True}
+
+
+def prescore_emoji(student_answer, keywords):
+    """Result dict for an obviously invalid emoji answer, or None to ask the LLM.
+
+    ``keywords`` are the Filipino words the emojis stand for (``EmojiSymbol.keyword``).
+    """
+    features = analyze(student_answer, keywords)
+    count = features['token_count']
+
+    if count == 0:
+        result = _invalid("Walang nakasulat na pangungusap. Sumulat ng pangungusap sa Filipino.")
+    elif count == 1:
+        result = _invalid("Isang salita lamang ito. Sumulat ng buong pangungusap.")
+    elif looks_foreign(features):
+        result = _invalid("Hindi ito pangungusap sa Filipino. Sumulat gamit ang wikang Filipino.")
+    else:
+        result = None
+    return _settle('emoji', result)
+
+
+def stats():
+    saved = sum(kind['saved'] for kind in _stats.values())
+    return {'llm_calls_saved': saved, **{kind: dict(counts) for kind, counts in _stats.items()}}
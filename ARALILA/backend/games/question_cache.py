@@ -0,0 +1,78 @@
+"""
+Cache of pre-serialized question sets.
+
+Entries are keyed by (area_id, game_type, difficulty) plus a global content
+version. ``games.signals`` bumps the version whenever question content is
+saved or deleted, which makes every older entry unreachable at once.
+Use a shared cache (``QUESTION_CACHE_ALIAS = 'redis'``) when running more than
+one worker; with the per-process default, other workers only see edits once
+``QUESTION_CACHE_TTL`` runs out.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from backend import metrics
+
+VERSION_KEY = "questions:version"
+
+
+def _cache():
+    return caches[settings.QUESTION_CACHE_ALIAS]
+
+
+def encode(data):
+    # Same compact, unicode-preserving output as DRF's JSONRenderer
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _fresh_version():
+    # Time based so a version key lost to eviction never restarts at an old number
+    return int(time.time() * 1000)
+
+
+def get_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (evicted or never set)
+        cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+
+
+def get_question_set(area_id, game_type, difficulty, build):
+    """
+    Return the cached entry for a question set, building it on a miss.
+
+    ``build`` loads the set from the database and returns a dict whose
+    ``questions`` value is already JSON-encoded bytes. Exceptions raised by
+    ``build`` (e.g. ``Area.DoesNotExist``) propagate and nothing is cached.
+    """
+    key = f"questions:v{get_version()}:{area_id}:{game_type}:{difficulty or 'all'}"
+    cache = _cache()
+    entry = cache.get(key)
+    metrics.cache_lookup(entry is not None)
+    if entry is None:
+        entry = build()
+        cache.set(key, entry, settings.QUESTION_CACHE_TTL)
+    return entry
+
+
+def render(questions, payload):
+    """JSON response with the cached ``questions`` bytes spliced in as-is."""
+    rest = encode(payload)
+    body = b'{"questions":' + questions
+    body += b',' + rest[1:] if payload else b'}'
+    return HttpResponse(body, content_type='application/json')
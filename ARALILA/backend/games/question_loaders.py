@@ -0,0 +1,210 @@
+"""
+Question loading plans per game type.
+
+Each entry in ``QUESTION_PLANS`` names the one-to-one relation holding the
+question data, the child relations to prefetch, and the row serializers for
+the difficulty endpoint and the per-type (whole area) endpoints. Loading a
+set therefore costs the same few queries whatever the number of items.
+"""
+from collections import namedtuple
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from backend.log import get_logger
+from .models import GameItem
+
+log = get_logger(__name__)
+
+QuestionPlan = namedtuple('QuestionPlan', ['relation', 'prefetch', 'serialize', 'serialize_for_area'])
+
+
+# -------------------- Difficulty set rows --------------------
+
+def serialize_spelling(item, spelling):
+    return {
+        'id': item.id,
+        'word': spelling.word,
+        'sentence': spelling.sentence,
+    }
+
+
+def serialize_grammar(item, grammar):
+    return {
+        'id': item.id,
+        'sentence': grammar.sentence,
+    }
+
+
+def serialize_emoji(item, emoji):
+    symbols = list(emoji.emojis.all())
+    return {
+        'id': item.id,
+        'emojis': [s.symbol for s in symbols],
+        'keywords': [s.keyword for s in symbols],
+        'translation': emoji.translation,
+    }
+
+
+def serialize_punctuation(item, punctuation):
+    return {
+        'id': item.id,
+        'sentence': punctuation.sentence,
+        'hint': punctuation.hint,
+        'answers': [
+            {'position': answer.position, 'mark': answer.mark}
+            for answer in punctuation.answers.all()
+        ],
+    }
+
+
+def serialize_parts_of_speech(item, pos):
+    return {
+        'id': item.id,
+        'sentence': pos.sentence,
+        'words': [
+            {'id': w.id, 'word': w.word, 'correct_answer': w.correct_answer}
+            for w in pos.words.all()
+        ],
+        'hint': pos.hint,
+        'explanation': pos.explanation,
+    }
+
+
+def serialize_word_association(item, fourpics):
+    return {
+        'id': item.id,
+        'answer': fourpics.answer,
+        'images': [img.image_path for img in fourpics.images.all()],
+        'hint': fourpics.hint,
+    }
+
+
+# -------------------- Per-type (whole area) rows --------------------
+
+def serialize_spelling_for_area(item, spelling):
+    return [{
+        'id': item.id,
+        'word': spelling.word,
+        'sentence': spelling.sentence,
+        'difficulty': item.get_difficulty_display(),
+    }]
+
+
+def serialize_grammar_for_area(item, grammar):
+    return [{
+        'id': item.id,
+        'sentence': grammar.sentence,
+        'difficulty': item.get_difficulty_display(),
+    }]
+
+
+def serialize_emoji_for_area(item, emoji):
+    return [{
+        'id': item.id,
+        'emojis': [
+            {'symbol': s.symbol, 'keyword': s.keyword}
+            for s in emoji.emojis.all()
+        ],
+        'translation': emoji.translation,
+        'difficulty': item.get_difficulty_display(),
+    }]
+
+
+def serialize_punctuation_for_area(item, punctuation):
+    return [{
+        'id': item.id,
+        'sentence': punctuation.sentence,
+        'answers': [
+            {'position': answer.position, 'mark': answer.mark}
+            for answer in punctuation.answers.all()
+        ],
+        'hint': punctuation.hint,
+        'difficulty': item.get_difficulty_display(),
+    }]
+
+
+def serialize_parts_of_speech_for_area(item, pos):
+    # One question per tagged word
+    return [
+        {
+            'id': f"{item.id}-{w.word}",
+            'sentence': pos.sentence,
+            'word': w.word,
+            'correctAnswer': w.correct_answer,
+            'hint': pos.hint,
+            'explanation': pos.explanation,
+            'difficulty': item.get_difficulty_display(),
+        }
+        for w in pos.words.all()
+    ]
+
+
+def serialize_word_association_for_area(item, fourpics):
+    return [{
+        'id': item.id,
+        'answer': fourpics.answer,
+        'images': [img.image_path for img in fourpics.images.all()],
+        'hint': fourpics.hint,
+        'difficulty': item.get_difficulty_display(),
+    }]
+
+
+QUESTION_PLANS = {
+    'spelling-challenge': QuestionPlan(
+        'spelling_data', (), serialize_spelling, serialize_spelling_for_area),
+    'punctuation-task': QuestionPlan(
+        'punctuation_data', ('punctuation_data__answers',), serialize_punctuation, serialize_punctuation_for_area),
+    'parts-of-speech': QuestionPlan(
+        'pos_data', ('pos_data__words',), serialize_parts_of_speech, serialize_parts_of_speech_for_area),
+    'word-association': QuestionPlan(
+        'fourpics_data', ('fourpics_data__images',), serialize_word_association, serialize_word_association_for_area),
+    'emoji-challenge': QuestionPlan(
+        'emoji_data', ('emoji_data__emojis',), serialize_emoji, serialize_emoji_for_area),
+    'grammar-check': QuestionPlan(
+        'grammar_data', (), serialize_grammar, serialize_grammar_for_area),
+}
+
+
+def load_items(game_type, **filters):
+    """GameItems of ``game_type`` with their question data joined/prefetched."""
+    plan = QUESTION_PLANS[game_type]
+    return (
+        GameItem.objects.filter(game__game_type=game_type, **filters)
+        .select_related(plan.relation)
+        .prefetch_related(*plan.prefetch)
+    )
+
+
+def _question_data(item, plan):
+    # Reverse one-to-one raises when an item has no question row attached
+    try:
+        return getattr(item, plan.relation)
+    except ObjectDoesNotExist:
+        log.warning("question_data_missing", relation=plan.relation, item_id=item.id)
+        return None
+
+
+def serialize_difficulty_set(game_type, items):
+    """Rows for get_game_questions_by_difficulty."""
+    plan = QUESTION_PLANS.get(game_type)
+    if plan is None:
+        return []
+
+    questions = []
+    for item in items:
+        data = _question_data(item, plan)
+        if data is not None:
+            questions.append(plan.serialize(item, data))
+    return questions
+
+
+def serialize_area_set(game_type, items):
+    """Rows for the per-type endpoints (all difficulties of an area)."""
+    plan = QUESTION_PLANS[game_type]
+
+    questions = []
+    for item in items:
+        data = _question_data(item, plan)
+        if data is not None:
+            questions.extend(plan.serialize_for_area(item, data))
+    return questions
@@ -0,0 +1,78 @@
+"""
+Process-wide async Redis client for consumers and caches.
+
+The client is created lazily on first use and shares one bounded
+``BlockingConnectionPool``; callers wait up to ``REDIS_POOL_TIMEOUT`` for a
+free connection instead of opening new ones. Async connections belong to
+the event loop that created them, so there is one pool per running loop
+(in practice one per Daphne worker). ``close()`` runs on server shutdown
+(``backend.lifespan``). Round-trips are counted against the current request or socket
+message (``backend.metrics``).
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+from backend import lifespan, metrics
+
+_clients = weakref.WeakKeyDictionary()
+
+
+class CountingPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        metrics.redis_call()  # the whole pipeline is one round-trip
+        return await super().execute(raise_on_error)
+
+
+class CountingRedis(aioredis.Redis):
+    """Redis client that reports each round-trip to ``backend.metrics``."""
+
+    async def execute_command(self, *args, **options):
+        metrics.redis_call()
+        return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+async def get_redis():
+    """Shared Redis client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_POOL_TIMEOUT,
+            health_check_interval=30,
+        )
+        client = CountingRedis(connection_pool=pool)
+        _clients[loop] = client
+    return client
+
+
+async def close():
+    """Close the current loop's pool (other loops' pools are closed with their loop)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+        await client.connection_pool.disconnect()
+
+
+def stats():
+    pools = []
+    for client in list(_clients.values()):
+        pool = client.connection_pool
+        pools.append({
+            'max_connections': pool.max_connections,
+            'in_use': len(getattr(pool, '_in_use_connections', ())),
+            'idle': len([c for c in getattr(pool, '_available_connections', ()) if c is not None]),
+        })
+    return {'pools': pools}
+
+
+lifespan.on_shutdown(close)
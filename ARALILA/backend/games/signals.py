@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import question_cache
+from .models import (
+    Area,
+    EmojiSentenceItem,
+    EmojiSymbol,
+    FourPicsOneWordImage,
+    FourPicsOneWordItem,
+    Game,
+    GameItem,
+    GrammarItem,
+    PartsOfSpeechItem,
+    PartsOfSpeechWord,
+    PunctuationAnswer,
+    PunctuationItem,
+    SpellingItem,
+)
+
+# Everything that ends up inside a cached question set
+QUESTION_CONTENT_MODELS = [
+    Area,
+    Game,
+    GameItem,
+    SpellingItem,
+    PunctuationItem,
+    PunctuationAnswer,
+    PartsOfSpeechItem,
+    PartsOfSpeechWord,
+    FourPicsOneWordItem,
+    FourPicsOneWordImage,
+    GrammarItem,
+    EmojiSentenceItem,
+    EmojiSymbol,
+]
+
+
+def invalidate_question_sets(sender, **kwargs):
+    # After commit: a bump inside the transaction lets a concurrent request
+    # rebuild the set from the old rows and cache it under the new version
+    transaction.on_commit(question_cache.bump_version)
+
+
+for model in QUESTION_CONTENT_MODELS:
+    post_save.connect(invalidate_question_sets, sender=model)
+    post_delete.connect(invalidate_question_sets, sender=model)
@@ -0,0 +1,278 @@
+"""
+Write-behind persistence of story-chain games.
+
+Game flow never touches the database: ``StoryGame`` appends events to the
+``story:events`` Redis stream with ``emit`` (one XADD, errors swallowed).
+The ``persist_story_events`` management command runs in its own process,
+reads the stream through a consumer group and writes each batch to
+GameRoom / GamePlayer / GameRound / SentenceContribution /
+SentenceEvaluation with ``bulk_create`` in one transaction. It acks the
+batch only after the commit. Events are delivered at least once, so
+``persist_batch`` skips rows that already exist. MultiplayerStats is
+updated incrementally when a game completes.
+
+Every event carries the room code and the id of the game it belongs to
+(``StoryRoom.game_id``). GameRoom rows are keyed by the game
+(``GameRoom.game_key``), since room codes are reused once a room is empty.
+
+Events (``data`` is JSON):
+
+    join           {"player", "user_id"}
+    round_closed   {"image_index", "image_url", "total_images", "parts", "at"}
+    round_scored   {"image_index", "sentence", "score"}
+    game_complete  {"scores", "total_images"}
+"""
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from backend.log import get_logger
+from .models import GamePlayer, GameRoom, GameRound, SentenceContribution, SentenceEvaluation
+from progress.models import MultiplayerStats
+
+log = get_logger(__name__)
+
+STREAM_KEY = "story:events"
+GROUP = "persister"
+MISSED_TURN = "[missed turn]"
+
+
+async def emit(redis, event_type, room_name, game_id, **data):
+    """Append a room event to the stream; never raises."""
+    try:
+        await redis.xadd(
+            STREAM_KEY,
+            {
+                "type": event_type,
+                "room": room_name,
+                "game": game_id or "",
+                "data": json.dumps(data, ensure_ascii=False),
+            },
+            maxlen=settings.STORY_EVENTS_STREAM_MAXLEN,
+            approximate=True,
+        )
+    except Exception as e:
+        log.warning("story_event_not_recorded", room=room_name, event_type=event_type, error=repr(e))
+
+
+# -------------------- Reading the stream (sync, persister process) --------------------
+
+def ensure_group(redis):
+    try:
+        redis.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_batch(redis, consumer, count, block=None, pending=False):
+    """
+    Next batch for ``consumer`` as [(entry_id, event)].
+
+    With ``pending`` it re-reads entries delivered to this consumer but not
+    acked (e.g. after a crash) instead of new ones.
+    """
+    response = redis.xreadgroup(
+        GROUP, consumer, {STREAM_KEY: "0" if pending else ">"}, count=count, block=block
+    )
+    batch = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            event = json.loads(fields.get("data") or "{}")
+            event["type"] = fields.get("type")
+            event["room"] = fields.get("room")
+            # Events written before game ids existed are keyed by room code
+            event["game"] = fields.get("game") or event["room"]
+            batch.append((entry_id, event))
+    return batch
+
+
+def drain(redis, consumer, batch_size=500, block=None, pending=False):
+    """Persist and ack one batch. Returns the number of events processed."""
+    batch = read_batch(redis, consumer, batch_size, block=block, pending=pending)
+    if not batch:
+        return 0
+    persist_batch([event for _, event in batch])
+    redis.xack(STREAM_KEY, GROUP, *[entry_id for entry_id, _ in batch])
+    return len(batch)
+
+
+# -------------------- Writing --------------------
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+
+@transaction.atomic
+def persist_batch(events):
+    """Write a batch of room events; safe to replay."""
+    if not events:
+        return
+
+    by_type = defaultdict(list)
+    for event in events:
+        by_type[event["type"]].append(event)
+
+    # Rooms, one per game
+    room_names = {event["game"]: event["room"] for event in events}
+    rooms = GameRoom.objects.in_bulk(list(room_names), field_name="game_key")
+    total_images = {
+        event["game"]: event["total_images"]
+        for event in events if event.get("total_images")
+    }
+    new_rooms = [
+        GameRoom(game_key=game, room_name=name, total_images=total_images.get(game, 5))
+        for game, name in room_names.items() if game not in rooms
+    ]
+    GameRoom.objects.bulk_create(new_rooms)
+    rooms = GameRoom.objects.in_bulk(list(room_names), field_name="game_key")
+
+    # Players (joins plus anyone seen in a round, in case the join was trimmed)
+    seen = {}
+    for event in by_type["join"]:
+        seen[(event["game"], event["player"])] = event.get("user_id")
+    for event in by_type["round_closed"]:
+        for part in event["parts"]:
+            seen.setdefault((event["game"], part["player"]), None)
+    for event in by_type["game_complete"]:
+        for player in event["scores"]:
+            seen.setdefault((event["game"], player), None)
+
+    room_ids = [room.id for room in rooms.values()]
+    players = {
+        (player.room.game_key, player.name): player
+        for player in GamePlayer.objects.filter(room_id__in=room_ids).select_related("room")
+    }
+    GamePlayer.objects.bulk_create([
+        GamePlayer(room=rooms[game], name=name, user_id=user_id)
+        for (game, name), user_id in seen.items()
+        if (game, name) not in players
+    ])
+    linked = []
+    for key, user_id in seen.items():
+        player = players.get(key)
+        if player is not None and user_id and not player.user_id:
+            player.user_id = user_id
+            linked.append(player)
+    GamePlayer.objects.bulk_update(linked, ["user"])
+    players = {
+        (player.room.game_key, player.name): player
+        for player in GamePlayer.objects.filter(room_id__in=room_ids).select_related("room")
+    }
+
+    # Rounds and their contributions
+    existing_rounds = set(
+        GameRound.objects.filter(room_id__in=room_ids).values_list("room__game_key", "round_index")
+    )
+    closed = list({
+        (event["game"], event["image_index"]): event
+        for event in by_type["round_closed"]
+        if (event["game"], event["image_index"]) not in existing_rounds
+    }.values())
+    GameRound.objects.bulk_create([
+        GameRound(
+            room=rooms[event["game"]],
+            round_index=event["image_index"],
+            image_url=event.get("image_url"),
+            completed_at=_timestamp(event.get("at")),
+            evaluated_sentence=" ".join(
+                part["text"] for part in event["parts"] if part["text"] != MISSED_TURN
+            ),
+        )
+        for event in closed
+    ])
+    rounds = {
+        (game_round.room.game_key, game_round.round_index): game_round
+        for game_round in GameRound.objects.filter(room_id__in=room_ids).select_related("room")
+    }
+    SentenceContribution.objects.bulk_create([
+        SentenceContribution(
+            round=rounds[(event["game"], event["image_index"])],
+            player=players[(event["game"], part["player"])],
+            word_or_phrase=part["text"][:255],
+            turn_order=turn_order,
+            was_skipped=part["text"] == MISSED_TURN,
+        )
+        for event in closed
+        for turn_order, part in enumerate(event["parts"])
+    ])
+
+    # Scores (the last score for a round wins, e.g. end-of-game corrections)
+    scored = {}
+    for event in by_type["round_scored"]:
+        game_round = rounds.get((event["game"], event["image_index"]))
+        if game_round is not None:
+            game_round.group_score = event["score"]
+            scored[game_round.id] = game_round
+    GameRound.objects.bulk_update(scored.values(), ["group_score"])
+
+    evaluations = SentenceEvaluation.objects.in_bulk(list(scored), field_name="round_id")
+    for round_id, evaluation in evaluations.items():
+        evaluation.overall_score = scored[round_id].group_score
+    SentenceEvaluation.objects.bulk_update(evaluations.values(), ["overall_score"])
+    SentenceEvaluation.objects.bulk_create([
+        SentenceEvaluation(round=game_round, overall_score=game_round.group_score)
+        for round_id, game_round in scored.items() if round_id not in evaluations
+    ])
+
+    # Finished games
+    for event in by_type["game_complete"]:
+        room = rooms[event["game"]]
+        if room.status == "completed":
+            continue  # replayed event
+        room.status = "completed"
+        room.current_image_index = event.get("total_images", room.total_images)
+        room.save(update_fields=["status", "current_image_index"])
+
+        room_players = []
+        for name, score in event["scores"].items():
+            player = players[(event["game"], name)]
+            player.score = score
+            room_players.append(player)
+        GamePlayer.objects.bulk_update(room_players, ["score"])
+        update_multiplayer_stats(room, room_players)
+
+
+def update_multiplayer_stats(room, room_players):
+    """Fold one finished room into each registered player's MultiplayerStats."""
+    by_user = {player.user_id: player for player in room_players if player.user_id}
+    if not by_user:
+        return
+
+    # Rounds each player wrote in (not just missed) and the sentence score they earned
+    round_scores = defaultdict(dict)
+    rows = SentenceContribution.objects.filter(
+        round__room=room, was_skipped=False, player__in=list(by_user.values())
+    ).values_list("player__user_id", "round_id", "round__group_score")
+    for user_id, round_id, group_score in rows:
+        round_scores[user_id][round_id] = group_score
+
+    stats = {
+        row.user_id: row
+        for row in MultiplayerStats.objects.select_for_update().filter(user_id__in=list(by_user))
+    }
+    created = []
+    for user_id, player in by_user.items():
+        row = stats.get(user_id)
+        if row is None:
+            row = MultiplayerStats(user_id=user_id)
+            created.append(row)
+
+        sentence_scores = list(round_scores[user_id].values())
+        played = row.total_rounds_played + len(sentence_scores)
+        if played:
+            row.average_sentence_score = (
+                row.average_sentence_score * row.total_rounds_played + sum(sentence_scores)
+            ) / played
+        row.total_rounds_played = played
+        row.total_rooms_played += 1
+        row.total_score += player.score
+
+    MultiplayerStats.objects.bulk_create(created)
+    MultiplayerStats.objects.bulk_update(
+        [row for row in stats.values()],
+        ["total_rooms_played", "total_rounds_played", "average_sentence_score", "total_score"],
+    )
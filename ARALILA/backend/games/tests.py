@@ -1,3 +1,1132 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import jwt
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+
+from . import emoji_evaluation, evaluation_cache, openai_client, prescorer, question_cache, routing, story_persistence
+from .codec import MsgpackCodec, get_codec
+from .redis_pool import CountingRedis
+from .consumers import presence
+from .consumers import evaluation_pool
+from .consumers.evaluation_pool import EvaluationPool
+from .consumers import lobby_consumer
+from .consumers.lobby_consumer import LobbyConsumer
+from .consumers.lobby_state import Lobby
+from .consumers.room_state import StoryRoom
+from .consumers import story_scoring
+from .consumers.story_game import EVALUATION_DEADLINES_KEY, FALLBACK_SCORE, StoryGame
+from .consumers.turn_scheduler import CLAIMED_KEY, DEADLINES_KEY, TurnScheduler
+from .data.story_images import story_images
+from .models import (
+    Area, EmojiSentenceItem, EmojiSymbol, Game, GameItem, GamePlayer, GameRoom, GameRound,
+    SentenceContribution,
+)
+from backend import lifespan, log, metrics, urls
+from progress.models import GameProgress, MultiplayerStats
+from users import auth_cache
+from users.models import CustomUser
+
+
+class UnlockedAreasTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="student@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.game = Game.objects.create(name="Spelling", game_type="spelling-challenge")
+
+    def make_area(self, order_index, items=1, score=None):
+        area = Area.objects.create(name=f"Area {order_index}", order_index=order_index)
+        for i in range(items):
+            GameItem.objects.create(game=self.game, area=area, order_index=i)
+        if score is not None:
+            GameProgress.objects.create(
+                user=self.user, area=area, game=self.game, score=score, completed=True
+            )
+        return area
+
+    def fetch_areas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('unlocked_areas'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['areas'], len(ctx.captured_queries)
+
+    def test_lock_chain(self):
+        self.make_area(0, score=90)
+        self.make_area(1, score=50)
+        self.make_area(2)
+        self.make_area(3, items=0)
+
+        areas, _ = self.fetch_areas()
+
+        self.assertEqual([a['is_locked'] for a in areas], [False, False, True, True])
+        self.assertEqual(areas[0]['message'], "Start your journey here!")
+        self.assertEqual(areas[1]['message'], "Unlocked!")
+        self.assertEqual(areas[2]['message'], "Achieve 70% average in Area 1 (current: 50%)")
+        self.assertEqual(areas[3]['message'], "Complete all games in Area 2 to unlock")
+        self.assertEqual(areas[0]['completed_games'], 1)
+        self.assertEqual(areas[0]['average_score'], 90.0)
+        self.assertEqual(areas[3]['total_games'], 6)
+
+    def test_query_count_is_constant(self):
+        self.make_area(0, score=90)
+        self.make_area(1)
+        _, few_queries = self.fetch_areas()
+
+        for order_index in range(2, 8):
+            self.make_area(order_index, items=3, score=80)
+        areas, many_queries = self.fetch_areas()
+
+        self.assertEqual(len(areas), 8)
+        self.assertEqual(few_queries, many_queries)
+        self.assertLessEqual(many_queries, 2)
+
+
+class QuestionLoaderTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="student@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.area = Area.objects.create(name="Palaruan", order_index=0)
+        self.game = Game.objects.create(name="Emoji", game_type="emoji-challenge")
+        GameProgress.objects.create(user=self.user, area=self.area, game=self.game)
+        cache.clear()
+
+    def add_emoji_items(self, count, difficulty=1):
+        start = GameItem.objects.filter(difficulty=difficulty).count()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(start, start + count):
+                item = GameItem.objects.create(
+                    game=self.game, area=self.area, difficulty=difficulty, order_index=i
+                )
+                emoji = EmojiSentenceItem.objects.create(item=item, translation=f"Sentence {i}")
+                EmojiSymbol.objects.create(emoji_item=emoji, symbol="🐶", keyword="aso")
+                EmojiSymbol.objects.create(emoji_item=emoji, symbol="🏃", keyword="tumakbo")
+
+    def fetch_questions(self):
+        url = reverse('get_game_questions_by_difficulty', args=[self.area.id, 'emoji-challenge', 1])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['questions'], len(ctx.captured_queries)
+
+    def test_difficulty_set_query_count_is_constant(self):
+        self.add_emoji_items(2)
+        questions, few_queries = self.fetch_questions()
+        self.assertEqual(questions[0]['emojis'], ["🐶", "🏃"])
+        self.assertEqual(questions[0]['keywords'], ["aso", "tumakbo"])
+
+        self.add_emoji_items(6)
+        questions, many_queries = self.fetch_questions()
+
+        self.assertEqual(len(questions), 8)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_per_type_endpoint_uses_registry(self):
+        self.add_emoji_items(3)
+        self.add_emoji_items(1, difficulty=2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('emoji_questions', args=[self.area.id]), secure=True)
+
+        questions = response.json()['questions']
+        self.assertEqual(len(questions), 4)
+        self.assertEqual(questions[0]['emojis'][0], {'symbol': "🐶", 'keyword': "aso"})
+        self.assertEqual(questions[-1]['difficulty'], "Medium")
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_cached_set_only_queries_progress(self):
+        self.add_emoji_items(3)
+        self.fetch_questions()
+
+        questions, queries = self.fetch_questions()
+
+        self.assertEqual(len(questions), 3)
+        self.assertEqual(queries, 1)
+
+    def test_content_edit_invalidates_cached_set(self):
+        self.add_emoji_items(1)
+        self.fetch_questions()
+
+        emoji = EmojiSentenceItem.objects.get()
+        emoji.translation = "Tumakbo ang aso."
+        with self.captureOnCommitCallbacks(execute=True):
+            emoji.save()
+        questions, _ = self.fetch_questions()
+
+        self.assertEqual(questions[0]['translation'], "Tumakbo ang aso.")
+
+    def test_cached_set_is_invalidated_only_on_commit(self):
+        self.add_emoji_items(1)
+        self.fetch_questions()
+
+        with mock.patch.object(question_cache, 'bump_version') as bump:
+            with self.captureOnCommitCallbacks() as callbacks:
+                EmojiSentenceItem.objects.update(translation="Tumakbo ang aso.")
+                EmojiSentenceItem.objects.get().save()
+                CustomUser.objects.create(email="other@example.com")
+            bump.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(bump.call_count, 1)
+
+
+class AreaDetailTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="student@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.area = Area.objects.create(name="Palaruan", order_index=0)
+
+    def add_game(self, game_type, **progress):
+        game = Game.objects.create(name=game_type, game_type=game_type, order_index=Game.objects.count())
+        GameItem.objects.create(game=game, area=self.area)
+        if progress:
+            GameProgress.objects.create(user=self.user, area=self.area, game=game, **progress)
+        return game
+
+    def fetch(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_payload_and_query_count(self):
+        self.add_game('spelling-challenge', difficulty_1_completed=True, score=85, stars_earned=1)
+        self.add_game('grammar-check')
+        detail_url = reverse('area_detail', args=[self.area.id])
+        order_url = reverse('area_by_order', args=[self.area.order_index])
+
+        data, few_queries = self.fetch(detail_url)
+        spelling, grammar = data['games']
+        self.assertEqual(spelling['next_difficulty'], 2)
+        self.assertEqual(spelling['difficulty_unlocked'], {'1': True, '2': True, '3': False})
+        self.assertEqual(spelling['attempts'], 1)
+        self.assertEqual(grammar['attempts'], 0)
+        self.assertEqual(data['area']['average_score'], 85.0)
+
+        for game_type in ['emoji-challenge', 'parts-of-speech', 'punctuation-task', 'word-association']:
+            self.add_game(game_type, score=70)
+
+        data, many_queries = self.fetch(detail_url)
+        self.assertEqual(len(data['games']), 6)
+        self.assertEqual(few_queries, many_queries)
+        self.assertLessEqual(many_queries, 3)
+
+        order_data, order_queries = self.fetch(order_url)
+        self.assertEqual(order_data['games'], data['games'])
+        self.assertEqual(order_queries, many_queries)
+
+
+class SubmitScoreTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="student@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.area = Area.objects.create(name="Palaruan", order_index=0)
+        self.game = Game.objects.create(name="Spelling", game_type="spelling-challenge")
+
+    def submit(self, score, difficulty=1, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        response = self.client.post(reverse('submit_game_score'), {
+            'area_id': self.area.id,
+            'game_type': 'spelling-challenge',
+            'difficulty': difficulty,
+            'score': score,
+        }, format='json', secure=True, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_retry_with_same_key_is_not_counted_twice(self):
+        first = self.submit(90, key="attempt-1")
+        retry = self.submit(90, key="attempt-1")
+        self.submit(60, key="attempt-2")
+
+        progress = GameProgress.objects.get()
+        self.assertEqual(first['unlocked_message'], "✅ Medium difficulty unlocked!")
+        self.assertTrue(retry['duplicate'])
+        self.assertEqual(retry['stars_earned'], 1)
+        self.assertEqual(progress.attempts, 2)
+        self.assertEqual(progress.difficulty_1_score, 90)
+        self.assertTrue(progress.difficulty_2_unlocked)
+
+    def test_submission_writes_progress_once(self):
+        GameProgress.objects.create(user=self.user, area=self.area, game=self.game)
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.submit(85)
+
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(data['next_difficulty'], 2)
+
+
+def fake_openai(create):
+    """Serve ``create`` as chat.completions.create from the shared OpenAI client."""
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return mock.patch.object(openai_client, 'get_client', return_value=client)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = CustomUser.objects.create(email="student@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Area.objects.create(name="Area 0", order_index=0)
+
+    def fetch_areas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('unlocked_areas'), secure=True)
+        return response, len(ctx.captured_queries)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_queries_are_counted_per_endpoint(self):
+        response, queries = self.fetch_areas()
+
+        self.assertRegex(response['Server-Timing'], rf'^db;dur=[\d.]+;desc="{queries} queries", ')
+        stats = metrics.stats()['unlocked_areas']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['queries_max'], queries)
+        self.assertEqual(stats['over_budget'], 0)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_server_timing_header_is_opt_in(self):
+        response, _ = self.fetch_areas()
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.stats()['unlocked_areas']['requests'], 1)
+
+    def test_query_budget_overrun_is_logged(self):
+        with override_settings(QUERY_BUDGETS={'unlocked_areas': 0}), \
+                self.assertLogs('backend.middleware', 'WARNING') as captured:
+            self.fetch_areas()
+
+        self.assertEqual(captured.records[0].getMessage(), "query_budget_exceeded")
+        self.assertEqual(metrics.stats()['unlocked_areas']['over_budget'], 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_requires_token(self):
+        self.fetch_areas()
+
+        self.assertEqual(self.client.get(reverse('metrics'), secure=True).status_code, 403)
+        response = self.client.get(reverse('metrics'), secure=True, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.json()['endpoints']['unlocked_areas']['requests'], 1)
+        self.assertIn('auth_cache', response.json()['components'])
+
+
+class ReadinessTests(TestCase):
+    def test_ready_when_every_check_passes(self):
+        with mock.patch.dict(urls.READINESS_CHECKS, {'redis': lambda: None}):
+            response = self.client.get(reverse('readiness_check'), secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checks'], {'database': 'ok', 'redis': 'ok'})
+
+    def test_unavailable_dependency_fails_the_probe(self):
+        def down():
+            raise ConnectionError("refused")
+
+        with mock.patch.dict(urls.READINESS_CHECKS, {'redis': down}), \
+                self.assertLogs('backend.urls', 'ERROR') as captured:
+            response = self.client.get(reverse('readiness_check'), secure=True)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks'], {'database': 'ok', 'redis': 'fail'})
+        self.assertNotIn('refused', response.content.decode())
+        self.assertEqual(captured.records[0].fields, {'check': 'redis'})
+        self.assertIn('refused', captured.output[0])
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def test_disabled_level_builds_no_record(self):
+        logger = log.get_logger('games.tests.quiet')
+        with mock.patch.object(logger.logger, 'isEnabledFor', return_value=False), \
+                mock.patch.object(logger.logger, 'handle') as handle:
+            logger.debug("ws_message_received", room="r1")
+        handle.assert_not_called()
+
+    @override_settings(LOG_SAMPLE_RATES={'noisy': 0.25})
+    def test_sampled_events_keep_a_fraction_and_say_so(self):
+        logger = log.get_logger('games.tests.sampled')
+        with self.assertLogs('games.tests.sampled', 'INFO') as captured, \
+                mock.patch.object(log.random, 'random', side_effect=[0.1, 0.9, 0.5, 0.2]):
+            for _ in range(4):
+                logger.info("noisy", room="r1")
+            logger.info("rare", room="r1")
+
+        events = [(record.getMessage(), record.fields) for record in captured.records]
+        self.assertEqual(events, [
+            ("noisy", {"room": "r1", "sample_rate": 0.25}),
+            ("noisy", {"room": "r1", "sample_rate": 0.25}),
+            ("rare", {"room": "r1"}),
+        ])
+
+    def test_formatter_renders_fields(self):
+        record = logging.LogRecord('games', logging.INFO, __file__, 1, "player_joined", None, None)
+        record.fields = {"room": "r1", "player": "Maria Clara"}
+
+        line = log.StructuredFormatter('logfmt').format(record)
+        self.assertTrue(line.endswith('event=player_joined room=r1 player="Maria Clara"'))
+        self.assertEqual(json.loads(log.StructuredFormatter('json').format(record))['player'], "Maria Clara")
+
+
+class FakeRedisMixin:
+    """Points the module-level Redis helpers at an in-memory fakeredis server."""
+
+    def setUp(self):
+        super().setUp()
+        self.redis_server = fakeredis.FakeServer()
+        patcher = mock.patch.object(evaluation_cache, 'get_redis', self.fake_redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def fake_redis(self):
+        return fakeredis.FakeAsyncRedis(server=self.redis_server, decode_responses=True)
+
+
+class EmojiEvaluationTests(FakeRedisMixin, SimpleTestCase):
+    def completion(self, content):
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def test_evaluates_through_async_client(self):
+        create = mock.AsyncMock(return_value=self.completion(
+            '```json{"valid": true, "explanation": "Tama", "corrected": ""}```'
+        ))
+        with fake_openai(create):
+            response = await self.async_client.post(
+                reverse('evaluate_emoji_sentence'),
+                {'answer': "Tumakbo ang aso.", 'emojis': ["aso", "tumakbo"]},
+                content_type='application/json',
+                secure=True,
+            )
+
+        self.assertEqual(response.json()['valid'], True)
+
+    @override_settings(EMOJI_EVAL_TIMEOUT=0.05)
+    async def test_timeout_returns_fallback(self):
+        async def slow(**kwargs):
+            await asyncio.sleep(1)
+
+        with fake_openai(slow):
+            result = await emoji_evaluation.evaluate("Tumakbo ang aso.", ["aso"])
+
+        self.assertTrue(result['fallback'])
+
+    async def test_normalized_answers_share_one_llm_call(self):
+        create = mock.AsyncMock(return_value=self.completion(
+            '{"valid": true, "explanation": "Tama", "corrected": ""}'
+        ))
+        with fake_openai(create):
+            await emoji_evaluation.evaluate("Tumakbo ang aso.", ["Aso", "tumakbo"])
+            result = await emoji_evaluation.evaluate("  tumakbo   ANG aso. ", ["aso", "Tumakbo"])
+
+        self.assertTrue(result['valid'])
+        self.assertEqual(create.await_count, 1)
+
+
+class AsyncStackTests(SimpleTestCase):
+    def test_middleware_chain_runs_on_the_event_loop(self):
+        # One sync-only middleware would wrap the whole chain in sync_to_async
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    def test_every_middleware_supports_async(self):
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+    async def test_static_files_are_served_without_django_views(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, 'app.css'), 'w') as f:
+                f.write('body {}')
+            with override_settings(STATIC_ROOT=root):
+                response = await self.async_client.get('/static/app.css', secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'body {}')
+
+
+class ShutdownTests(SimpleTestCase):
+    def test_daphne_reactor_gets_the_shutdown_hook(self):
+        from twisted.internet import reactor
+
+        with mock.patch.object(lifespan, 'on_reactor_shutdown') as hook:
+            lifespan.install_daphne_shutdown()
+
+        hook.assert_called_once_with(reactor)
+
+    async def test_reactor_shutdown_runs_the_close_callbacks(self):
+        pool = evaluation_pool.get_evaluation_pool()
+        pool.submit(mock.AsyncMock())
+        reactor = mock.Mock()
+
+        lifespan.on_reactor_shutdown(reactor)
+        phase, event, trigger = reactor.addSystemEventTrigger.call_args.args
+        await trigger().asFuture(asyncio.get_running_loop())
+
+        self.assertEqual((phase, event), ("before", "shutdown"))
+        self.assertEqual(pool.stats()['workers'], 0)
+        self.assertIsNone(evaluation_pool._pools.get(asyncio.get_running_loop()))
+
+    async def test_failing_close_callback_is_logged(self):
+        reactor = mock.Mock()
+        with mock.patch.object(lifespan, '_shutdown', [mock.AsyncMock(side_effect=ConnectionError("gone"))]), \
+                self.assertLogs('backend.lifespan', 'ERROR') as captured:
+            lifespan.on_reactor_shutdown(reactor)
+            trigger = reactor.addSystemEventTrigger.call_args.args[2]
+            await trigger().asFuture(asyncio.get_running_loop())
+
+        self.assertEqual(captured.records[0].getMessage(), "shutdown_failed")
+
+
+class PrescorerTests(FakeRedisMixin, SimpleTestCase):
+    def test_obvious_story_sentences_are_settled_locally(self):
+        description = story_images[0]["description"]
+        self.assertEqual(prescorer.prescore_story("", description), 1)
+        self.assertEqual(prescorer.prescore_story("aso", description), 2)
+        self.assertEqual(prescorer.prescore_story("aso aso aso aso", description), 2)
+        self.assertEqual(prescorer.prescore_story("The scouts plant a tree", description), 3)
+        self.assertIsNone(prescorer.prescore_story("Nagtanim ang mga iskawt ng puno.", description))
+
+    def test_filipino_without_function_words_is_escalated(self):
+        self.assertIsNone(prescorer.prescore_story("Nagtanim iskawt puno", story_images[0]["description"]))
+        self.assertIsNone(prescorer.prescore_emoji("Umuulan kahapon", ["ulan"]))
+        self.assertIsNone(prescorer.prescore_emoji("Kumakain Juan mansanas", ["mansanas"]))
+        # Neither a keyword nor English: still for the LLM to judge
+        self.assertIsNone(prescorer.prescore_emoji("Kumakain Juan mansanas", []))
+
+    async def test_non_filipino_emoji_answer_skips_the_llm(self):
+        saved = prescorer.stats()['llm_calls_saved']
+        create = mock.AsyncMock()
+        with fake_openai(create):
+            english = await emoji_evaluation.evaluate("The dog runs fast", ["aso", "tumakbo"])
+            emoji_only = await emoji_evaluation.evaluate("🐶🏃", ["aso", "tumakbo"])
+
+        self.assertFalse(english['valid'])
+        self.assertFalse(emoji_only['valid'])
+        create.assert_not_awaited()
+        self.assertEqual(prescorer.stats()['llm_calls_saved'], saved + 2)
+
+
+class EmojiKeywordTests(TestCase):
+    async def test_symbols_are_resolved_to_their_keywords(self):
+        game = await Game.objects.acreate(name="Emoji", game_type="emoji-challenge")
+        item = await GameItem.objects.acreate(game=game, area=await Area.objects.acreate(name="A", order_index=0))
+        emoji = await EmojiSentenceItem.objects.acreate(item=item, translation="Kumain ng mansanas")
+        await EmojiSymbol.objects.acreate(emoji_item=emoji, symbol="🍎", keyword="mansanas")
+
+        keywords = await emoji_evaluation.keywords_for(["🍎", "guro"])
+        self.assertCountEqual(keywords, ["guro", "mansanas"])
+        # Mixed-language answers that use the keyword go to the LLM
+        self.assertFalse(prescorer.prescore_emoji("I like the mansanas", [])["valid"])
+        self.assertIsNone(prescorer.prescore_emoji("I like the mansanas", keywords))
+
+
+class EvaluationCacheTests(FakeRedisMixin, SimpleTestCase):
+    @override_settings(EVALUATION_CACHE_MAX_ENTRIES=2)
+    async def test_least_recently_used_entry_is_evicted(self):
+        await evaluation_cache.set('story', ("a", "img"), {"score": 1})
+        await evaluation_cache.set('story', ("b", "img"), {"score": 2})
+        await asyncio.sleep(0.01)
+        await evaluation_cache.get('story', ("a", "img"))
+        await evaluation_cache.set('story', ("c", "img"), {"score": 3})
+
+        self.assertEqual(await evaluation_cache.get('story', ("a", "img")), {"score": 1})
+        self.assertIsNone(await evaluation_cache.get('story', ("b", "img")))
+        self.assertEqual(await evaluation_cache.get('story', ("c", "img")), {"score": 3})
+
+    @override_settings(EVALUATION_CACHE_TIMEOUT=0.05)
+    async def test_slow_redis_counts_as_a_miss(self):
+        async def hanging_redis():
+            await asyncio.sleep(1)
+
+        with mock.patch.object(evaluation_cache, 'get_redis', hanging_redis):
+            started = time.perf_counter()
+            await evaluation_cache.set('story', ("a", "img"), {"score": 1})
+            self.assertIsNone(await evaluation_cache.get('story', ("a", "img")))
+
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+class StoryRoomTests(FakeRedisMixin, SimpleTestCase):
+    players = ["ana", "ben", "cara"]
+
+    async def make_room(self):
+        room = StoryRoom(await self.fake_redis(), "test")
+        for player in self.players:
+            await room.join(player, 2)
+        return room
+
+    async def test_concurrent_submits_complete_round_once(self):
+        room = await self.make_room()
+        await room.start_turn()
+
+        # Every player spams submits at once; only the player whose turn it is may write
+        for _ in range(5):
+            results = await asyncio.gather(*[
+                room.contribute(player, f"{player}-word", 2)
+                for player in self.players for _ in range(4)
+            ])
+            statuses = [result.status for result in results]
+            self.assertLessEqual(statuses.count("complete"), 1)
+
+        state = await room.snapshot()
+        self.assertTrue(state["evaluating"])
+        self.assertEqual(len(state["current_sentence"]), len(self.players))
+
+        rounds = await asyncio.gather(*[room.complete_round(0) for _ in range(10)])
+        winners = [result for result in rounds if result is not None]
+        self.assertEqual(winners, [(1, 2)])
+
+        awards = {player: 3 for player in self.players}
+        scored = await asyncio.gather(*[room.award_round(0, awards) for _ in range(10)])
+        scored = [result for result in scored if result is not None]
+        self.assertEqual(scored, [(False, {player: 5 for player in self.players})])
+
+    async def test_stale_timer_cannot_skip_a_new_turn(self):
+        room = await self.make_room()
+        _, seq = await room.start_turn()
+        result = await room.contribute("ana", "Ang", 2)
+        self.assertEqual((result.status, result.turn_seq, result.next_player), ("next", seq, "ben"))
+
+        # ana's deadline fires late with the old sequence number
+        stale = await room.expire_turn(seq, "[missed turn]", -2)
+        self.assertEqual(stale.status, "rejected")
+
+        expired = await room.expire_turn(result.next_seq, "[missed turn]", -2)
+        self.assertEqual((expired.status, expired.player), ("next", "ben"))
+        state = await room.snapshot()
+        self.assertEqual(state["scores"], {"ana": 2, "ben": -2, "cara": 0})
+
+
+class LobbyTests(FakeRedisMixin, SimpleTestCase):
+    async def test_simultaneous_joins_start_the_game_once(self):
+        # One Lobby per player, as if each socket were on its own worker
+        names = [f"player{n}" for n in range(8)]
+        lobbies = [Lobby(await self.fake_redis(), "ABCD") for _ in names]
+        results = await asyncio.gather(*[lobby.join(name) for lobby, name in zip(lobbies, names)])
+
+        self.assertEqual(sum(1 for _, start, _ in results if start), 1)
+        self.assertCountEqual(await lobbies[0].players(), names)
+
+    async def test_rejoin_keeps_place_and_last_leave_resets(self):
+        lobby = Lobby(await self.fake_redis(), "ABCD")
+        await lobby.join("ana")
+        await lobby.join("ben")
+        added, _, players = await lobby.join("ana")
+        self.assertEqual((added, players), (False, ["ana", "ben"]))
+
+        await lobby.leave("ana")
+        await lobby.leave("ben")
+        _, start, _ = await lobby.join("cara")
+        self.assertFalse(start)
+        self.assertEqual(await lobby.players(), ["cara"])
+
+    async def test_disconnect_after_failed_connect(self):
+        metrics.reset()
+        consumer = LobbyConsumer()
+        consumer.scope = {"url_route": {"kwargs": {"room_code": "ABCD"}}, "query_string": b"player=ana"}
+        with mock.patch.object(lobby_consumer, 'get_redis', side_effect=ConnectionError("redis down")):
+            with self.assertRaises(ConnectionError):
+                await consumer.connect()
+
+        await consumer.disconnect(1011)
+        self.assertEqual(metrics.socket_stats()["rooms"], {})
+
+
+class PresenceTests(FakeRedisMixin, SimpleTestCase):
+    players = ["ana", "ben", "cara"]
+
+    async def make_room(self):
+        room = StoryRoom(await self.fake_redis(), "test")
+        for player in self.players:
+            await room.join(player, 2)
+        await room.start_turn()
+        return room
+
+    async def test_evicting_the_turn_holder_passes_the_turn(self):
+        room = await self.make_room()
+        self.assertEqual(await room.evict("ana"), ("turn", "ben", 2))
+        # ana's old deadline is now stale
+        self.assertEqual((await room.expire_turn(1, "[missed turn]", -2)).status, "rejected")
+
+        await room.contribute("ben", "Ang", 2)
+        self.assertEqual((await room.contribute("cara", "aso", 2)).status, "complete")
+
+    async def test_evictions_keep_turn_order_and_close_empty_rooms(self):
+        room = await self.make_room()
+        await room.contribute("ana", "Ang", 2)
+        await room.contribute("ben", "aso", 2)
+        self.assertEqual(await room.evict("ana"), ("evicted", "cara", 3))
+        self.assertEqual(await room.evict("cara"), ("complete", None, None))
+
+        self.assertEqual(await room.evict("ben"), ("empty", None, None))
+        self.assertIsNone(await room.snapshot())
+
+    @override_settings(PRESENCE_TTL=30)
+    async def test_sweep_evicts_players_without_heartbeat(self):
+        redis = await self.fake_redis()
+        room = await self.make_room()
+        evict = mock.AsyncMock()
+        presence.register("test", lambda redis, name: room.players(), evict)
+        self.addCleanup(presence._kinds.pop, "test")
+
+        await presence.Presence(redis, "test", "test", "ana").touch()
+        await presence.Presence(redis, "test", "test", "cara").touch()
+        await presence.sweep(redis)
+
+        evict.assert_awaited_once_with("test", "ben")
+
+
+class TurnSchedulerTests(FakeRedisMixin, SimpleTestCase):
+    async def test_due_deadline_fires_once_across_workers(self):
+        fired = []
+
+        async def handler(room_name, turn_seq):
+            fired.append((room_name, turn_seq))
+
+        workers = [TurnScheduler(await self.fake_redis(), handler) for _ in range(4)]
+        await workers[0].schedule("room1", 1, 0)
+        await workers[0].schedule("room1", 2, 60)
+        await workers[1].schedule("room2", 7, 0)
+
+        counts = await asyncio.gather(*[worker.fire_due() for worker in workers])
+        await asyncio.sleep(0)
+
+        self.assertEqual(sum(counts), 2)
+        self.assertCountEqual(fired, [("room1", 1), ("room2", 7)])
+
+    async def test_cancelled_deadline_never_fires(self):
+        handler = mock.AsyncMock()
+        scheduler = TurnScheduler(await self.fake_redis(), handler)
+        await scheduler.schedule("room1", 3, 0)
+        await scheduler.cancel("room1", 3)
+
+        self.assertEqual(await scheduler.fire_due(), 0)
+        handler.assert_not_awaited()
+
+    async def test_claim_is_released_once_the_handler_ran(self):
+        redis = await self.fake_redis()
+        scheduler = TurnScheduler(redis, mock.AsyncMock())
+        await scheduler.schedule("room1", 1, 0)
+
+        await scheduler.fire_due()
+        await asyncio.gather(*scheduler._running)
+
+        scheduler.handler.assert_awaited_once_with("room1", 1)
+        self.assertIsNone(await scheduler.next_due())
+
+    async def test_claim_of_a_dead_worker_fires_again_after_the_timeout(self):
+        async def hang(room_name, turn_seq):
+            await asyncio.Event().wait()
+
+        redis = await self.fake_redis()
+        dead = TurnScheduler(redis, hang, claim_timeout=30)
+        await dead.schedule("room1", 1, 0)
+        now = time.time()
+        self.assertEqual(await dead.fire_due(now), 1)
+        await asyncio.sleep(0)
+        for task in dead._running:
+            task.cancel()  # the worker dies mid-handler
+
+        handler = mock.AsyncMock()
+        alive = TurnScheduler(redis, handler)
+        self.assertEqual(await alive.fire_due(now + 10), 0)
+        self.assertEqual(await alive.next_due(), now + 30)
+
+        self.assertEqual(await alive.fire_due(now + 31), 1)
+        await asyncio.sleep(0)
+        handler.assert_awaited_once_with("room1", 1)
+        self.assertEqual(await redis.zcard(CLAIMED_KEY), 0)
+
+    async def test_idle_loop_sleeps_until_a_deadline_is_scheduled(self):
+        handler = mock.AsyncMock()
+        scheduler = TurnScheduler(await self.fake_redis(), handler)
+        with mock.patch.object(scheduler, 'fire_due', wraps=scheduler.fire_due) as fire_due:
+            scheduler.start()
+            try:
+                await asyncio.sleep(0.3)
+                self.assertEqual(fire_due.await_count, 1)
+
+                await scheduler.schedule("room1", 1, 0.05)
+                await asyncio.sleep(0.3)
+            finally:
+                await scheduler.stop()
+
+        handler.assert_awaited_once_with("room1", 1)
+        self.assertEqual(fire_due.await_count, 3)
+
+    async def test_submit_replaces_the_open_deadline(self):
+        redis = await self.fake_redis()
+        scheduler = TurnScheduler(redis, mock.AsyncMock())
+        evaluation_deadlines = TurnScheduler(redis, mock.AsyncMock(), key=EVALUATION_DEADLINES_KEY)
+        game = StoryGame(redis, "room1", InMemoryChannelLayer(), scheduler, EvaluationPool(1, 10), evaluation_deadlines)
+        await game.join("ana")
+        await game.join("ben")
+        self.assertEqual(await redis.zrange(DEADLINES_KEY, 0, -1), ["room1:1"])
+
+        await game.submit("ana", "Ang")
+        self.assertEqual(await redis.zrange(DEADLINES_KEY, 0, -1), ["room1:2"])
+
+
+class StoryGameMixin(FakeRedisMixin):
+    """A one-player StoryGame on fakeredis whose room broadcasts can be read back."""
+
+    async def make_game(self, user_id=None):
+        redis = await self.fake_redis()
+        self.layer = InMemoryChannelLayer()
+        self.channel = await self.layer.new_channel()
+        await self.layer.group_add("story_room1", self.channel)
+        self.pool = EvaluationPool(2, 10)
+        evaluation_deadlines = TurnScheduler(redis, mock.AsyncMock(), key=EVALUATION_DEADLINES_KEY)
+        game = StoryGame(
+            redis, "room1", self.layer, TurnScheduler(redis, mock.AsyncMock()), self.pool, evaluation_deadlines
+        )
+        await game.join("ana", user_id)
+        return game
+
+    async def events(self):
+        events = []
+        while self.layer.channels.get(self.channel):
+            message = await self.layer.receive(self.channel)
+            events.append(get_codec().decode(message["payload"]))
+        return events
+
+
+class TurnRestartTests(StoryGameMixin, SimpleTestCase):
+    async def test_third_player_replaces_the_first_deadline(self):
+        game = await self.make_game()
+        await game.join("ben")
+        await game.join("cara")
+        await self.pool.stop()
+
+        redis = await self.fake_redis()
+        self.assertEqual(await redis.zrange(DEADLINES_KEY, 0, -1), ["room1:2"])
+
+
+class BroadcastCodecTests(StoryGameMixin, SimpleTestCase):
+    @override_settings(STORY_WIRE_CODEC='msgpack')
+    async def test_broadcast_is_encoded_once_for_all_recipients(self):
+        game = await self.make_game()
+        await self.events()
+        other = await self.layer.new_channel()
+        await self.layer.group_add("story_room1", other)
+
+        event = {"type": "story_update", "player": "ana", "text": "Naglaro ang mga bata"}
+        with mock.patch.object(MsgpackCodec, 'encode', autospec=True, side_effect=MsgpackCodec.encode) as encode:
+            await game.broadcast(event)
+
+        encode.assert_called_once()
+        for channel in (self.channel, other):
+            message = await self.layer.receive(channel)
+            self.assertTrue(message["binary"])
+            self.assertEqual(get_codec('msgpack').decode(message["payload"]), event)
+
+
+class SocketMetricsTests(StoryGameMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    async def test_message_counts_redis_round_trips(self):
+        redis = CountingRedis(
+            connection_pool=fakeredis.FakeAsyncRedis(server=self.redis_server).connection_pool
+        )
+        with metrics.message("story", "submit_sentence"):
+            await redis.set("k", 1)
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get("k")
+                pipe.incr("k")
+                await pipe.execute()
+        await redis.get("k")  # outside any message
+
+        stats = metrics.socket_stats()["messages"]["story:submit_sentence"]
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["redis_calls_avg"], 2)
+
+    async def test_broadcasts_and_rooms_are_counted(self):
+        await self.make_game()  # joins a player: one players_update broadcast
+        metrics.connected("story", "room1")
+        metrics.connected("story", "room1")
+        metrics.disconnected("story", "room1")
+        await self.pool.stop()
+
+        stats = metrics.socket_stats()
+        self.assertEqual(stats["broadcasts"]["story"]["broadcasts"]["players_update"]["count"], 1)
+        self.assertGreater(stats["broadcasts"]["story"]["broadcasts"]["players_update"]["bytes_avg"], 0)
+        self.assertEqual(stats["rooms"]["story"], {"rooms": 1, "connections": 1})
+
+    def test_histogram_percentiles_use_bucket_bounds(self):
+        histogram = metrics.Histogram()
+        for ms in [0.5] * 90 + [40] * 9 + [700]:
+            histogram.observe(ms)
+
+        summary = histogram.summary()
+        self.assertEqual((summary["p50_ms"], summary["p95_ms"], summary["max_ms"]), (1, 50, 700))
+
+
+class BackgroundEvaluationTests(StoryGameMixin, SimpleTestCase):
+    async def test_next_round_starts_before_the_score_arrives(self):
+        game = await self.make_game()
+        release = asyncio.Event()
+
+        async def slow_evaluation(sentence, image_description):
+            await release.wait()
+            return 12
+
+        with mock.patch.object(game, 'evaluate_with_ai', slow_evaluation):
+            await game.submit("ana", "Tumakbo ang aso.")
+            state = await game.get_state()
+            self.assertEqual((state["current_image_index"], state["pending_evaluations"]), (1, 1))
+            self.assertNotIn("sentence_evaluation", [e["type"] for e in await self.events()])
+
+            release.set()
+            await self.pool.queue.join()
+        await self.pool.stop()
+
+        evaluation = [e for e in await self.events() if e["type"] == "sentence_evaluation"]
+        self.assertEqual(evaluation[0]["score"], 12)
+        self.assertEqual((await game.get_state())["scores"], {"ana": 14})
+
+    @override_settings(STORY_EVAL_TIMEOUT=0.05)
+    async def test_timeout_awards_fallback_score(self):
+        game = await self.make_game()
+
+        async def hang(sentence, image_description):
+            await asyncio.sleep(1)
+
+        with mock.patch.object(game, 'evaluate_with_ai', hang):
+            await game.submit("ana", "Tumakbo ang aso.")
+            await self.pool.queue.join()
+        await self.pool.stop()
+
+        self.assertEqual((await game.get_state())["scores"], {"ana": 2 + FALLBACK_SCORE})
+
+    async def test_lost_evaluation_is_awarded_at_its_deadline(self):
+        game = await self.make_game()
+        redis = await self.fake_redis()
+
+        with mock.patch.object(self.pool, 'submit', return_value=True):  # queued, then the worker dies
+            await game.submit("ana", "Tumakbo ang aso.")
+        self.assertEqual(await redis.zrange(EVALUATION_DEADLINES_KEY, 0, -1), ["room1:0"])
+
+        await game.recover_round(0)
+
+        state = await game.get_state()
+        self.assertEqual((state["pending_evaluations"], state["scores"]), (0, {"ana": 2 + FALLBACK_SCORE}))
+        evaluation = [e for e in await self.events() if e["type"] == "sentence_evaluation"]
+        self.assertEqual((evaluation[0]["sentence"], evaluation[0]["score"]), ("Tumakbo ang aso.", FALLBACK_SCORE))
+
+    async def test_scored_round_disarms_its_deadline(self):
+        game = await self.make_game()
+        redis = await self.fake_redis()
+
+        with mock.patch.object(game, 'evaluate_with_ai', mock.AsyncMock(return_value=12)):
+            await game.submit("ana", "Tumakbo ang aso.")
+            await self.pool.queue.join()
+        await self.pool.stop()
+        self.assertEqual(await redis.zcard(EVALUATION_DEADLINES_KEY), 0)
+
+        await game.recover_round(0)  # a late deadline changes nothing
+
+        self.assertEqual((await game.get_state())["scores"], {"ana": 14})
+        evaluations = [e for e in await self.events() if e["type"] == "sentence_evaluation"]
+        self.assertEqual([e["score"] for e in evaluations], [12])
+
+    async def test_failures_while_scoring_still_finish_the_game(self):
+        game = await self.make_game()
+        award_round = game.room.award_round
+        failures = iter([ConnectionError("blip")])
+
+        async def flaky_award(image_index, awards):
+            for error in failures:
+                raise error
+            return await award_round(image_index, awards)
+
+        broadcast = game.broadcast
+
+        async def failing_broadcast(event):
+            if event["type"] == "sentence_evaluation":
+                raise ConnectionError("channel layer down")
+            await broadcast(event)
+
+        with mock.patch.object(game, 'evaluate_with_ai', mock.AsyncMock(side_effect=RuntimeError("bad response"))), \
+                mock.patch.object(game.room, 'award_round', flaky_award), \
+                mock.patch.object(game, 'broadcast', failing_broadcast):
+            for number in range(len(story_images)):
+                await game.submit("ana", f"Naglaro ang mga bata sa parke {number}.")
+            await self.pool.queue.join()
+        await self.pool.stop()
+
+        state = await game.get_state()
+        self.assertEqual(state["pending_evaluations"], 0)
+        self.assertEqual(
+            (await self.events())[-1],
+            {"type": "game_complete", "scores": {"ana": (2 + FALLBACK_SCORE) * len(story_images)}},
+        )
+
+
+@override_settings(STORY_EVAL_MODE='end_of_game')
+class EndOfGameScoringTests(StoryGameMixin, SimpleTestCase):
+    async def play(self, game):
+        for number in range(len(story_images)):
+            await game.submit("ana", f"Naglaro ang mga bata sa parke {number}.")
+        await self.pool.queue.join()
+        await self.pool.stop()
+
+    async def test_whole_game_is_scored_in_one_call(self):
+        game = await self.make_game()
+        evaluator = mock.AsyncMock(return_value=[20] * len(story_images))
+
+        with mock.patch.object(story_scoring, 'get_batch_evaluator', return_value=evaluator):
+            await self.play(game)
+
+        evaluator.assert_awaited_once()
+        self.assertEqual(len(evaluator.await_args.args[0]), len(story_images))
+        events = await self.events()
+        self.assertEqual(events[-1], {"type": "game_complete", "scores": {"ana": 22 * len(story_images)}})
+
+    @override_settings(STORY_BATCH_EVALUATOR='games.consumers.story_scoring.offline_batch_evaluator')
+    async def test_offline_evaluator_keeps_provisional_scores(self):
+        game = await self.make_game()
+        await self.play(game)
+
+        events = await self.events()
+        provisional = [e["score"] for e in events if e["type"] == "sentence_evaluation"]
+        final = [r["score"] for e in events if e["type"] == "final_evaluation" for r in e["rounds"]]
+        self.assertEqual(provisional, final)
+        self.assertEqual(events[-1]["scores"], {"ana": 2 * len(story_images) + sum(final)})
+
+    async def test_failed_correction_ends_on_provisional_scores(self):
+        game = await self.make_game()
+        evaluator = mock.AsyncMock(return_value=[20] * len(story_images))
+
+        with mock.patch.object(story_scoring, 'get_batch_evaluator', return_value=evaluator), \
+                mock.patch.object(game.room, 'add_scores', side_effect=ConnectionError("redis down")):
+            await self.play(game)
+
+        events = await self.events()
+        provisional = sum(e["score"] for e in events if e["type"] == "sentence_evaluation")
+        self.assertEqual(events[-1], {"type": "game_complete", "scores": {"ana": 2 * len(story_images) + provisional}})
+
+
+class StoryPersistenceTests(StoryGameMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create(email="ana@example.com")
+
+    async def play_and_persist(self):
+        game = await self.make_game(self.user.id)
+        with mock.patch.object(game, 'evaluate_with_ai', mock.AsyncMock(return_value=10)):
+            for number in range(len(story_images)):
+                await game.submit("ana", f"Naglaro ang mga bata sa parke {number}.")
+            await self.pool.queue.join()
+        await self.pool.stop()
+
+        stream = fakeredis.FakeRedis(server=self.redis_server, decode_responses=True)
+        story_persistence.ensure_group(stream)
+        events = await sync_to_async(story_persistence.read_batch)(stream, "test", 500)
+        await sync_to_async(story_persistence.persist_batch)([event for _, event in events])
+        return [event for _, event in events]
+
+    async def test_finished_game_is_written_in_batches(self):
+        events = await self.play_and_persist()
+
+        room = await GameRoom.objects.aget(room_name="room1")
+        self.assertEqual(room.status, "completed")
+        self.assertEqual(await GameRound.objects.filter(room=room, group_score=10).acount(), len(story_images))
+        self.assertEqual(await SentenceContribution.objects.filter(round__room=room).acount(), len(story_images))
+        player = await GamePlayer.objects.aget(room=room, name="ana")
+        self.assertEqual((player.user_id, player.score), (self.user.id, 12 * len(story_images)))
+
+        # Replayed events (at-least-once delivery) change nothing
+        await sync_to_async(story_persistence.persist_batch)(events)
+        self.assertEqual(await SentenceContribution.objects.filter(round__room=room).acount(), len(story_images))
+        stats = await MultiplayerStats.objects.aget(user=self.user)
+        self.assertEqual(
+            (stats.total_rooms_played, stats.total_rounds_played, stats.average_sentence_score, stats.total_score),
+            (1, len(story_images), 10.0, 12 * len(story_images)),
+        )
+
+    async def test_reused_room_code_is_a_new_game(self):
+        await self.play_and_persist()
+        await StoryRoom(await self.fake_redis(), "room1").evict("ana")  # room emptied
+        await self.play_and_persist()
+
+        rooms = [room async for room in GameRoom.objects.filter(room_name="room1").order_by("id")]
+        self.assertEqual([room.status for room in rooms], ["completed", "completed"])
+        self.assertNotEqual(rooms[0].game_key, rooms[1].game_key)
+        for room in rooms:
+            self.assertEqual(await GamePlayer.objects.filter(room=room, name="ana").acount(), 1)
+            self.assertEqual(await GameRound.objects.filter(room=room).acount(), len(story_images))
+        stats = await MultiplayerStats.objects.aget(user=self.user)
+        self.assertEqual(stats.total_rooms_played, 2)
+
+
+@mock.patch.dict(os.environ, {"SUPABASE_JWT_SECRET": "test-secret-for-story-consumer-tests"})
+class StoryConsumerTests(StoryGameMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        auth_cache.clear()
+        self.user = CustomUser.objects.create(email="ana@example.com", supabase_user_id="supabase-ana")
+
+    def token(self, secret="test-secret-for-story-consumer-tests", **claims):
+        payload = {
+            "sub": "supabase-ana",
+            "email": "ana@example.com",
+            "aud": "authenticated",
+            "exp": int(time.time()) + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(payload, secret, algorithm="HS256")
+
+    async def joined_user_id(self, token):
+        """Join room1 over a socket and return the user id recorded for the player."""
+        redis = await self.fake_redis()
+        self.pool = EvaluationPool(2, 10)
+
+        async def create(room_name, channel_layer=None):
+            evaluation_deadlines = TurnScheduler(redis, mock.AsyncMock(), key=EVALUATION_DEADLINES_KEY)
+            return StoryGame(
+                redis, room_name, channel_layer, TurnScheduler(redis, mock.AsyncMock()), self.pool, evaluation_deadlines
+            )
+
+        communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), "/ws/story/room1/")
+        with mock.patch.object(StoryGame, 'create', create), \
+                mock.patch.object(presence, 'start_sweeper', mock.AsyncMock()):
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({"type": "player_join", "player": "ana", "token": token})
+            await communicator.receive_output()  # players_update
+            await communicator.disconnect()
+        await self.pool.stop()
+
+        stream = fakeredis.FakeRedis(server=self.redis_server, decode_responses=True)
+        story_persistence.ensure_group(stream)
+        events = await sync_to_async(story_persistence.read_batch)(stream, "test", 500)
+        return next(event for _, event in events if event["type"] == "join")["user_id"]
+
+    async def test_player_is_resolved_from_supabase_token(self):
+        self.assertEqual(await self.joined_user_id(self.token()), self.user.id)
+
+    async def test_invalid_token_joins_as_guest(self):
+        self.assertIsNone(await self.joined_user_id(self.token(secret="forged-secret-for-story-consumer-tests")))
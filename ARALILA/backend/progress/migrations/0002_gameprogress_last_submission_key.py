@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameprogress',
+            name='last_submission_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
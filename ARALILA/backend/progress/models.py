@@ -29,6 +29,7 @@ class GameProgress(models.Model):
     completed = models.BooleanField(default=False)
     
     attempts = models.IntegerField(default=0)
+    last_submission_key = models.CharField(max_length=64, blank=True, default='')  # Idempotency-Key of the last applied score
     last_played = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -41,6 +42,11 @@ class GameProgress(models.Model):
     
     def update_stars(self):
         """Calculate stars based on difficulty completions (sequential logic)."""
+        self.apply_stars()
+        self.save()
+
+    def apply_stars(self):
+        """Same as update_stars() without saving."""
         stars = 0
         if self.difficulty_1_completed:
             stars = 1
@@ -51,7 +57,33 @@ class GameProgress(models.Model):
         if self.difficulty_3_completed:
             stars = 3
         self.stars_earned = stars
-        self.save()
+
+    def record_score(self, difficulty, score, passed):
+        """
+        Apply one submitted score in memory (caller saves).
+        Returns True when this score completed the difficulty for the first time.
+        """
+        newly_completed = False
+        if difficulty in (1, 2, 3):
+            score_field = f'difficulty_{difficulty}_score'
+            completed_field = f'difficulty_{difficulty}_completed'
+            if score > getattr(self, score_field):
+                setattr(self, score_field, score)
+            if passed and not getattr(self, completed_field):
+                setattr(self, completed_field, True)
+                newly_completed = True
+
+        self.attempts += 1
+        self.apply_stars()
+
+        # Overall best score (keep legacy)
+        self.score = max(
+            self.difficulty_1_score,
+            self.difficulty_2_score,
+            self.difficulty_3_score
+        )
+        self.completed = self.difficulty_3_completed
+        return newly_completed
     
     def can_access_difficulty(self, difficulty):
         """Sequential unlock: 1 always; 2 only after 1 completed; 3 only after 2 completed (or full mastery)."""
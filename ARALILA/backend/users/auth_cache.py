@@ -0,0 +1,113 @@
+"""
+Process-local cache for verified Supabase tokens.
+
+Decoded JWT claims are kept in a bounded LRU until the token's ``exp``. When
+``SUPABASE_AUTH_CACHE_ALIAS`` names a Django cache (e.g. the Redis one), it
+is used as a shared second level so other workers can reuse the same
+entries. Claims never change for a given token; user rows do (badges,
+streak, profile), and a per-process copy could not be invalidated in the
+other workers, so they are not cached: authentication reads the row by its
+unique ``supabase_user_id`` on every request.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from backend import metrics
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry expiry and hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    metrics.cache_lookup(True)
+                    return value
+                del self._data[key]
+            self.misses += 1
+        metrics.cache_lookup(False)
+        return None
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+_tokens = LRUCache(settings.SUPABASE_AUTH_CACHE_SIZE)
+
+
+def _shared_cache():
+    alias = settings.SUPABASE_AUTH_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_claims(token):
+    """Return cached claims for an already verified token, or None."""
+    key = token_key(token)
+    payload = _tokens.get(key)
+    shared = _shared_cache()
+    if payload is None and shared is not None:
+        payload = shared.get(f"auth:token:{key}")
+        if payload is not None:
+            _tokens.set(key, payload, payload['exp'] - time.time())
+    return payload
+
+
+def set_claims(token, payload):
+    """Remember verified claims until the token expires."""
+    if 'exp' not in payload:
+        return
+    ttl = payload['exp'] - time.time()
+    key = token_key(token)
+    _tokens.set(key, payload, ttl)
+    shared = _shared_cache()
+    if ttl > 0 and shared is not None:
+        shared.set(f"auth:token:{key}", payload, int(ttl))
+
+
+def clear():
+    _tokens.clear()
+
+
+def stats():
+    return {'tokens': _tokens.stats()}
@@ -3,8 +3,18 @@ import jwt
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from .models import CustomUser
+from . import auth_cache
 from datetime import date, timedelta
 
+BADGES_BY_STREAK = {
+    3: "1",
+    5: "2",
+    30: "3",
+    100: "4",
+    200: "5",
+}
+
+
 class SupabaseAuthentication(BaseAuthentication):
 
     def authenticate(self, request):
@@ -14,100 +24,26 @@ class SupabaseAuthentication(BaseAuthentication):
             return None
         
         token = auth_header.split(' ')[1]
+        return (self.authenticate_token(token), None)
 
+    def authenticate_token(self, token):
+        """Verify a Supabase access token and return its user, creating it on first login."""
         try:
-            payload = jwt.decode(
-                token,
-                os.getenv('SUPABASE_JWT_SECRET'),
-                algorithms=['HS256'],
-                audience='authenticated',
-                leeway=300
-            )
-            
-            user_id = payload.get('sub')
-            email = payload.get('email')
-            user_metadata = payload.get('user_metadata', {})
-
-            user, created = CustomUser.objects.get_or_create(
-                supabase_user_id=user_id,
-                defaults={
-                    'email': email,
-                    'first_name': user_metadata.get('first_name', ''),
-                    'last_name': user_metadata.get('last_name', ''),
-                    'school_name': user_metadata.get('school_name', ''),
-                }
-            )
-
-            # ---- UPDATE NAME INFO IF CHANGED ----
-            if not created:
-                updated = False
-                if user.email != email:
-                    user.email = email
-                    updated = True
-                if user.first_name != user_metadata.get('first_name', ''):
-                    user.first_name = user_metadata.get('first_name', '')
-                    updated = True
-                if user.last_name != user_metadata.get('last_name', ''):
-                    user.last_name = user_metadata.get('last_name', '')
-                    updated = True
-                
-                if updated:
-                    user.save()
-
-            # ---- LOGIN STREAK LOGIC ----
+            payload = self.decode_token(token)
             today = date.today()
-            new_streak = False
-
-            if user.last_login_date is None:
-                # First login ever
-                user.ls_points = 1
-                new_streak = True
-            else:
-                # Check streak
-                if user.last_login_date == today - timedelta(days=1):
-                    # Consecutive day → +1 point
-                    user.ls_points += 1
-                    new_streak = True
-                elif user.last_login_date == today:
-                    # Same-day login → do nothing
-                    new_streak = False
-                else:
-                    # Missed a day → reset streak
-                    user.ls_points = 1
-                    new_streak = True
-
-            # Update login date
-            user.last_login_date = today
-
-            # ---- COLLECT BADGES BASED ON LOGIN STREAK ----
-            badges_by_streak = {
-                3: "1",
-                5: "2",
-                30: "3",
-                100: "4",
-                200: "5",
-            }
+            user, created = self.get_user(payload)
 
-            if new_streak:
-                # Ensure collected_badges is a list of dicts
-                if not user.collected_badges:
-                    user.collected_badges = []
-
-                # Convert old list of badge IDs to dict format if needed
-                for i, b in enumerate(user.collected_badges):
-                    if isinstance(b, str):
-                        user.collected_badges[i] = {"id": b, "status": "unclaimed"}
-
-                existing_badge_ids = [b["id"] for b in user.collected_badges]
-
-                for streak, badge_id in badges_by_streak.items():
-                    if user.ls_points >= streak and badge_id not in existing_badge_ids:
-                        user.collected_badges.append({"id": badge_id, "status": "unclaimed"})
-            user.save()
+            update_fields = []
+            if not created:
+                update_fields += self.sync_profile(user, payload)
 
+            # Streak and badges only move once per day
+            if user.last_login_date != today:
+                update_fields += self.apply_login_streak(user, today)
 
-            # ---- RETURN USER ----
-            return (user, None)
+            if update_fields:
+                user.save(update_fields=update_fields)
+            return user
 
         except jwt.ExpiredSignatureError:
             raise AuthenticationFailed('Token has expired')
@@ -115,3 +51,90 @@ class SupabaseAuthentication(BaseAuthentication):
             raise AuthenticationFailed('Invalid token')
         except Exception as e:
             raise AuthenticationFailed(f'Authentication failed: {str(e)}')
+
+    def decode_token(self, token):
+        """Verify the JWT, reusing claims of tokens verified before."""
+        payload = auth_cache.get_claims(token)
+        if payload is None:
+            payload = jwt.decode(
+                token,
+                os.getenv('SUPABASE_JWT_SECRET'),
+                algorithms=['HS256'],
+                audience='authenticated',
+                leeway=300
+            )
+            auth_cache.set_claims(token, payload)
+        return payload
+
+    def profile_claims(self, payload):
+        user_metadata = payload.get('user_metadata', {})
+        return {
+            'email': payload.get('email'),
+            'first_name': user_metadata.get('first_name', ''),
+            'last_name': user_metadata.get('last_name', ''),
+        }
+
+    def get_user(self, payload):
+        """Load the user for the token, creating it on first login."""
+        user_id = payload.get('sub')
+        user = CustomUser.objects.filter(supabase_user_id=user_id).first()
+        if user is not None:
+            return user, False
+
+        user_metadata = payload.get('user_metadata', {})
+        return CustomUser.objects.get_or_create(
+            supabase_user_id=user_id,
+            defaults={
+                'email': payload.get('email'),
+                'first_name': user_metadata.get('first_name', ''),
+                'last_name': user_metadata.get('last_name', ''),
+                'school_name': user_metadata.get('school_name', ''),
+            }
+        )
+
+    def sync_profile(self, user, payload):
+        """Copy changed JWT claims onto the user. Returns the changed fields."""
+        changed = []
+        for field, value in self.profile_claims(payload).items():
+            if getattr(user, field) != value:
+                setattr(user, field, value)
+                changed.append(field)
+        return changed
+
+    def apply_login_streak(self, user, today):
+        """Advance the login streak and award badges. Returns the changed fields."""
+        if user.last_login_date == today - timedelta(days=1):
+            # Consecutive day → +1 point
+            user.ls_points += 1
+        else:
+            # First login ever or missed a day → (re)start streak
+            user.ls_points = 1
+
+        user.last_login_date = today
+
+        # Ensure collected_badges is a list of dicts
+        if not user.collected_badges:
+            user.collected_badges = []
+
+        # Convert old list of badge IDs to dict format if needed
+        for i, b in enumerate(user.collected_badges):
+            if isinstance(b, str):
+                user.collected_badges[i] = {"id": b, "status": "unclaimed"}
+
+        existing_badge_ids = [b["id"] for b in user.collected_badges]
+
+        for streak, badge_id in BADGES_BY_STREAK.items():
+            if user.ls_points >= streak and badge_id not in existing_badge_ids:
+                user.collected_badges.append({"id": badge_id, "status": "unclaimed"})
+
+        return ['ls_points', 'last_login_date', 'collected_badges']
+
+
+def user_for_token(token):
+    """User for a Supabase access token, or None when it is missing or invalid (e.g. for WebSockets)."""
+    if not token:
+        return None
+    try:
+        return SupabaseAuthentication().authenticate_token(token)
+    except AuthenticationFailed:
+        return None
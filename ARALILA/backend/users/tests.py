@@ -1,3 +1,121 @@
+import os
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import jwt
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+
+from . import auth_cache
+from .models import CustomUser
+from .supabase_auth import SupabaseAuthentication
+
+JWT_SECRET = "test-secret-for-supabase-auth-tests"
+
+
+@mock.patch.dict(os.environ, {"SUPABASE_JWT_SECRET": JWT_SECRET})
+class SupabaseAuthenticationTests(TestCase):
+    def setUp(self):
+        auth_cache.clear()
+
+    def make_request(self, **claims):
+        payload = {
+            "sub": "supabase-user-1",
+            "email": "student@example.com",
+            "aud": "authenticated",
+            "exp": int(time.time()) + 3600,
+            "user_metadata": {"first_name": "Juan", "last_name": "Dela Cruz"},
+        }
+        payload.update(claims)
+        token = jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+        return APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_same_day_request_does_not_write(self):
+        SupabaseAuthentication().authenticate(self.make_request())
+        auth_cache.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            user, _ = SupabaseAuthentication().authenticate(self.make_request())
+
+        self.assertEqual(user.ls_points, 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertTrue(ctx.captured_queries[0]["sql"].startswith("SELECT"))
+
+    def test_consecutive_day_updates_streak_only(self):
+        CustomUser.objects.create(
+            supabase_user_id="supabase-user-1",
+            email="student@example.com",
+            first_name="Juan",
+            last_name="Dela Cruz",
+            ls_points=2,
+            last_login_date=date.today() - timedelta(days=1),
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            user, _ = SupabaseAuthentication().authenticate(self.make_request())
+
+        self.assertEqual(user.ls_points, 3)
+        self.assertEqual(user.collected_badges, [{"id": "1", "status": "unclaimed"}])
+        update_sql = ctx.captured_queries[-1]["sql"]
+        self.assertIn('"ls_points"', update_sql)
+        self.assertNotIn('"email"', update_sql)
+
+    def test_changed_claims_are_synced(self):
+        SupabaseAuthentication().authenticate(self.make_request())
+
+        SupabaseAuthentication().authenticate(
+            self.make_request(user_metadata={"first_name": "Maria", "last_name": "Dela Cruz"})
+        )
+
+        self.assertEqual(CustomUser.objects.get().first_name, "Maria")
+
+    def test_cached_token_reads_only_the_user_row(self):
+        SupabaseAuthentication().authenticate(self.make_request())
+
+        with CaptureQueriesContext(connection) as ctx:
+            user, _ = SupabaseAuthentication().authenticate(self.make_request())
+
+        self.assertEqual(user.email, "student@example.com")
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(auth_cache.stats()["tokens"]["hits"], 1)
+
+    def test_writes_are_seen_by_the_next_request(self):
+        user, _ = SupabaseAuthentication().authenticate(self.make_request())
+        # e.g. from another worker; nothing cached per process to invalidate
+        CustomUser.objects.filter(pk=user.pk).update(collected_badges=[{"id": "1", "status": "unclaimed"}])
+
+        response = self.client.post(
+            reverse("claim-badge", args=["1"]),
+            HTTP_AUTHORIZATION=self.make_request().headers["Authorization"],
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        user, _ = SupabaseAuthentication().authenticate(self.make_request())
+        self.assertEqual(user.collected_badges, [{"id": "1", "status": "claimed"}])
+
+    def test_profile_and_badge_writes_keep_other_fields(self):
+        user, _ = SupabaseAuthentication().authenticate(self.make_request())
+        user.collected_badges = [{"id": "1", "status": "unclaimed"}, {"id": "2", "status": "unclaimed"}]
+        user.save()
+        # Written elsewhere; the views must not overwrite it
+        CustomUser.objects.filter(pk=user.pk).update(
+            collected_badges=[{"id": "1", "status": "unclaimed"}, {"id": "2", "status": "claimed"}],
+            ls_points=7,
+        )
+
+        auth = self.make_request().headers["Authorization"]
+        self.client.patch(
+            reverse("update-profile"), {"school_name": "Mataas na Paaralan"},
+            content_type="application/json", HTTP_AUTHORIZATION=auth, secure=True,
+        )
+        response = self.client.post(reverse("claim-badge", args=["1"]), HTTP_AUTHORIZATION=auth, secure=True)
+        self.assertEqual(response.status_code, 200)
 
-# Create your tests here.
+        user.refresh_from_db()
+        self.assertEqual((user.school_name, user.ls_points), ("Mataas na Paaralan", 7))
+        self.assertEqual(user.collected_badges, [{"id": "1", "status": "claimed"}, {"id": "2", "status": "claimed"}])
@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -21,10 +22,14 @@ def update_profile_view(request):
     """Update user profile (school_name, profile_pic)"""
     user = request.user
     allowed_fields = ['school_name', 'profile_pic']
+    updated_fields = []
     for field in allowed_fields:
         if field in request.data:
             setattr(user, field, request.data[field])
-    user.save()
+            updated_fields.append(field)
+    # Only write what this request changed
+    if updated_fields:
+        user.save(update_fields=updated_fields)
     serializer = CustomUserSerializer(user)
     return Response(serializer.data)
 
@@ -43,20 +48,25 @@ def user_badges_view(request):
 @permission_classes([IsAuthenticated])
 def claim_badge_view(request, badge_id: str):
     """Mark a badge as claimed"""
-    user: CustomUser = request.user
     updated = False
 
-    if not user.collected_badges:
-        return Response({"success": False, "message": "No badges found"}, status=400)
+    # Edit the badges on the locked row, not on request.user
+    with transaction.atomic():
+        user: CustomUser = CustomUser.objects.select_for_update().get(pk=request.user.pk)
+
+        if not user.collected_badges:
+            return Response({"success": False, "message": "No badges found"}, status=400)
+
+        for badge in user.collected_badges:
+            if badge.get("id") == badge_id and badge.get("status") != "claimed":
+                badge["status"] = "claimed"
+                updated = True
+                break
 
-    for badge in user.collected_badges:
-        if badge.get("id") == badge_id and badge.get("status") != "claimed":
-            badge["status"] = "claimed"
-            updated = True
-            break
+        if updated:
+            user.save(update_fields=['collected_badges'])
 
     if updated:
-        user.save()
         return Response({"success": True, "badge_id": badge_id})
     else:
         return Response({"success": False, "message": "Badge not found or already claimed"}, status=400)
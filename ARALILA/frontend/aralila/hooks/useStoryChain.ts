@@ -118,7 +118,9 @@ export function useStoryChain({ roomName, playerName, turnOrder }: UseStoryChain
   useEffect(() => {
     if (isConnected && !hasJoinedRef.current) {
       console.log('🎮 Joining game as:', playerName);
-      sendMessage({ type: 'player_join', player: playerName });
+      // The access token lets the backend attribute results to the account
+      const token = localStorage.getItem('access_token');
+      sendMessage({ type: 'player_join', player: playerName, token });
       hasJoinedRef.current = true;
     }
   }, [isConnected, playerName, sendMessage]);